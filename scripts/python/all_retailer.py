@@ -1,4 +1,3 @@
-
 ##########################################################################################################################
 #  Created Date: 05/06/2020
 #  Author : Arvind Gautam
@@ -10,19 +9,46 @@
 #                              availability, product description, product details and customer_reviews.
 
 #  Execution Instruction: This scripts requires chromedriver.exe matching the chrome version
+#                          python all_retailer.py [--retailers walmart amazon] [--input walmart=urls.csv] [--format jsonl]
+#                                                 [--concurrency 16] [--shard 0/4], see python all_retailer.py --help
+#                          Mixed input: python all_retailer.py --input urls.csv [--retailer-module my_retailer]
+#                          Reviews: python all_retailer.py --reviews [--review-pages 10] [--incremental]
+#                          Worker mode: python all_retailer.py --queue jobs.sqlite --enqueue, then on every worker
+#                                                 python all_retailer.py --queue jobs.sqlite --worker
 ##########################################################################################################################
 
 
 # importing required libraries
 
-import requests
-import pandas as pd
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+import argparse
 import os
+import socket
 import logging
+import threading
 from datetime import datetime
+from itertools import chain, repeat
+
+from fetcher import BrowserPool, BrowserFetcher, HttpFetcher, HybridFetcher, FetchScheduler, interleave
+from rate_limiter import RateLimiter
+from browser_profile import BrowserProfile, FULL_PROFILE
+from failures import DRIFT, RETRY_POLICIES, DeadLetters, read_dead_letters
+from product_index import ProductIndex, unique_products
+from incremental import DELTA_COLUMNS, ChangeDetector
+from urls import read_urls
+from reviews import REVIEW_COLUMNS, REVIEW_TEXT_FIELDS, ReviewIndex, asins_of, scrape_reviews
+from text_store import TextStore, text_store_path
+from records import ReviewRecord
+from job_queue import LeasedJobs, open_queue
+from sink import SINKS, open_sink
+from checkpoint import CheckpointStore
+from pipeline import Pipeline
+from selector_health import ACTIONS, SelectorHealth
+from page_cache import PageCache, CachingFetcher, ReplayFetcher
+from log_setup import setup_logging
+from metrics import METRICS
+from parsers import BACKENDS, get_backend
+from registry import load_modules, route, route_jobs
+from specs import SPECS
 
 #Creating timestamp
 date = datetime.now()
@@ -30,253 +56,560 @@ time_stamp = date.strftime("%d_%m_%Y_%H_%M_%S")
 
 #assigning variables
 CURRENT_DIR = os.path.abspath(os.path.dirname(__file__))
-DRIVER_PATH = os.path.join(CURRENT_DIR, r'..\..\drivers\chromedriver.exe')
-INPUT_WALMART = os.path.join(CURRENT_DIR, r'..\..\input\walmart_url.csv')
-OUTPUT_WALMART = os.path.join(CURRENT_DIR, r'..\..\output\walmart_output_' + time_stamp + '.csv')
-INPUT_AMAZON = os.path.join(CURRENT_DIR, r'..\..\input\amazon_url.csv')
-OUTPUT_AMAZON = os.path.join(CURRENT_DIR, r'..\..\output\amazon_output_' + time_stamp + '.csv')
-print(DRIVER_PATH)
+ROOT_DIR = os.path.normpath(os.path.join(CURRENT_DIR, '..', '..'))
+OUTPUT_DIR = os.path.join(ROOT_DIR, 'output')
+DRIVER_PATH = os.path.join(ROOT_DIR, 'drivers', 'chromedriver.exe' if os.name == 'nt' else 'chromedriver')
+INPUT_WALMART = os.path.join(ROOT_DIR, 'input', 'walmart_url.csv')
+OUTPUT_WALMART = os.path.join(OUTPUT_DIR, 'walmart_output_' + time_stamp)
+INPUT_AMAZON = os.path.join(ROOT_DIR, 'input', 'amazon_url.csv')
+OUTPUT_AMAZON = os.path.join(OUTPUT_DIR, 'amazon_output_' + time_stamp)
+CHECKPOINT_PATH = os.path.join(OUTPUT_DIR, 'scrape_checkpoint.sqlite')
+CACHE_DIR = os.path.join(ROOT_DIR, 'cache', 'pages')
+DEAD_LETTER_PATH = os.path.join(OUTPUT_DIR, 'dead_letters.jsonl')
+INDEX_PATH = os.path.join(OUTPUT_DIR, 'product_index.sqlite')
+REVIEW_INDEX_PATH = os.path.join(OUTPUT_DIR, 'review_index.sqlite')
+OUTPUT_REVIEWS = os.path.join(OUTPUT_DIR, 'amazon_reviews_' + time_stamp)
+
+# retailers of other modules, each one registering its RetailerSpec in registry.py at import (see specs.py)
+RETAILER_MODULES = []
+
+# input files of mixed urls, every url goes to the retailer of its host (the `hosts` of the specs) and the urls of
+# unknown hosts are dropped. With mixed inputs the default input file of a retailer is only read when given again
+# with "--input retailer=path"
+MIXED_INPUTS = []
+
+# number of urls taken from each input file, None for all of them. Finished urls are recorded in CHECKPOINT_PATH
+# and skipped by the next run, failed ones are retried
+URL_LIMIT = None
+
+# the input urls are reduced to their product key (ASIN, walmart item id) and every product is fetched once per run.
+# INDEX_PATH keeps the last scrape time and row hash of every product, the ones scraped less than RESCRAPE_AFTER
+# seconds ago are skipped, None to never skip them
+RESCRAPE_AFTER = None
+
+# (i, N) to scrape only the ith of N shards of the products, split by a hash of the product key, so that one crawl
+# can run on N machines. None for all the products
+SHARD = None
+
+# incremental runs write only the changes of the tracked fields of specs.py (price, List_price, availability,
+# rating) since the last scrape of every product, into <output>_changes.<format>. They do not skip the products done
+# by an earlier run, set RESCRAPE_AFTER to resume an interrupted incremental run
+INCREMENTAL = False
+
+# worker mode: "--enqueue" puts the (retailer, url) jobs of the inputs in the queue at QUEUE_URL (a sqlite file, or
+# redis://host:port/db with the redis package), then any number of "--worker" runs lease them in small batches and
+# write their rows to output files of their own in the shared output directory. A job is acked once its row is on
+# disk, the jobs of a worker which stops without acking are leased again QUEUE_VISIBILITY_TIMEOUT seconds later.
+# The queue replaces the checkpoint of the single machine runs
+QUEUE_URL = None
+QUEUE_VISIBILITY_TIMEOUT = 600
+WORKER = False
+
+# "--reviews" walks the review pages of the amazon input products instead, up to REVIEW_PAGES pages per product, and
+# writes one row per review to OUTPUT_REVIEWS. Reviews already in REVIEW_INDEX_PATH are not written again, the
+# incremental runs stop walking a product at its first known review
+REVIEW_PAGES = 10
+
+# urls out of retries are appended to DEAD_LETTER_PATH with their failure kind. With RERUN_DEAD_LETTERS the run
+# takes its urls from that file instead of the input files, the file is renamed first so it only gets the new failures
+RERUN_DEAD_LETTERS = False
+
+# fetch settings: "browser" renders every page in one of POOL_SIZE headless chrome workers,
+# "http" downloads the server html directly for pages which do not need javascript,
+# "hybrid" tries http first and only escalates to the browser when REQUIRED_SELECTORS are missing,
+# "replay" runs the extractors on the pages of CACHE_DIR only, without browser or network
+FETCH_MODE = "hybrid"
+POOL_SIZE = 4
+HTTP_CONCURRENCY = 16
+# seconds before a page load of the browser fails, (connect, read) seconds of the http fetches
+PAGE_LOAD_TIMEOUT = 60
+HTTP_TIMEOUT = (10, 30)
+# the browsers skip images, media, fonts and the ad/tracker hosts and stop loading once the product nodes are there,
+# False keeps the full page loads. See browser_benchmark.py
+TRIM_BROWSER = True
+
+# politeness: at most RATE_LIMITS requests/sec and HOST_CONCURRENCY fetches in flight per host. Both are halved
+# when a host answers 429/503 or a captcha, and the host waits a jittered backoff.
+# Failed fetches are retried as set in the RETRY_POLICIES of failures.py for their failure kind
+RATE_LIMITS = {
+    'walmart.com': 1.0,
+    'amazon.com': 1.0,
+}
+DEFAULT_RATE_LIMIT = 1.0
+HOST_CONCURRENCY = 4
+
+# parser backend of the extractor specs: "bs4", "bs4-strained", "lxml" or "selectolax", see parser_benchmark.py.
+# Pages wait for the PARSE_WORKERS parser processes in a queue of at most PAGE_QUEUE_SIZE pages
+PARSER = "bs4"
+PARSE_WORKERS = os.cpu_count()
+PAGE_QUEUE_SIZE = 64
+
+# output settings: rows are appended to the output file in batches of OUTPUT_BATCH_SIZE rows or every
+# OUTPUT_FLUSH_INTERVAL seconds. OUTPUT_FORMAT is one of "csv", "jsonl" or "parquet"
+OUTPUT_FORMAT = "csv"
+OUTPUT_BATCH_SIZE = 100
+OUTPUT_FLUSH_INTERVAL = 10.0
+# with TEXT_STORE the large text fields (`text_fields` of specs.py, the review bodies) are written compressed to
+# <output>_texts.sqlite and the output file holds their "text:<hash>" reference, read back by text_store.read_output()
+TEXT_STORE = False
+
+# selector health: the hit rate of every field is tracked over the last HEALTH_WINDOW parsed pages of each retailer.
+# Once HEALTH_MIN_PAGES pages are in, a field found on fewer than HEALTH_THRESHOLD of them (the `min_hit_rate` of its
+# FieldSpec when set) means the markup changed. HEALTH_ACTION "pause" stops fetching that retailer, "abort" stops the
+# crawl and "warn" only logs it. The urls not fetched stay pending, the last HEALTH_SAMPLES pages missing fields are
+# saved under HEALTH_SAMPLE_DIR
+HEALTH_WINDOW = 200
+HEALTH_MIN_PAGES = 50
+HEALTH_THRESHOLD = 0.2
+HEALTH_ACTION = "pause"
+HEALTH_SAMPLES = 5
+HEALTH_SAMPLE_DIR = os.path.join(OUTPUT_DIR, 'drift_samples_' + time_stamp)
+
+# fetched pages are kept in CACHE_DIR and reused for CACHE_TTL seconds, the least recently used ones are dropped
+# above CACHE_MAX_BYTES. The incremental runs never read the cache, they compare the live pages with the last scrape,
+# and only refresh it. False for CACHE turns the cache off except for the replay mode
+CACHE = True
+CACHE_TTL = 24 * 3600
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# selectors which must be present in the raw html before the browser can be skipped. The browser waits for them
+# before taking the page source. The product pages use the `required_selectors` of the spec of their retailer
+REQUIRED_SELECTORS = {
+    'amazon.com/product-reviews/': ['#cm_cr-review_list'],
+}
 
 #Generating logs
+# SCRAPER_LOG_LEVEL=DEBUG adds the per-field messages, SCRAPER_LOG_FORMAT=json writes one json object per line
+LOG_LEVEL = os.environ.get('SCRAPER_LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.environ.get('SCRAPER_LOG_FORMAT', 'text')
 
-LOG_PATH = os.path.join(CURRENT_DIR, r'..\..\log\scraping_log_file_' + time_stamp + '.log')
+# the log file is created by main(), importing this module has no side effect
+LOG_PATH = os.path.join(ROOT_DIR, 'log', 'scraping_log_file_' + time_stamp + '.log')
 logger = logging.getLogger()
-fhandler = logging.FileHandler(filename=LOG_PATH, mode='a')
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-fhandler.setFormatter(formatter)
-logger.addHandler(fhandler)
-logger.setLevel(logging.INFO)
-print(LOG_PATH)
-
-# Initiating the chrome session
-option = webdriver.ChromeOptions()
-option.add_argument('headless')
-driver = webdriver.Chrome(executable_path=DRIVER_PATH, options=option)
-logger.info("Browser initiated")
-
-def walmart():
-    ''' This functions extracts the data from walmart.com and saves the output as walmart_output.csv'''
-
-    indicator = "yes"
-    Counter = 0
-
-    # taking urls as the input from the csv file
-    df_input = pd.read_csv(INPUT_WALMART, header=None)
-    url_list = df_input[0]
-    logger.info("Inputs recieved")
-    
-    for url in url_list[:5]:
-        
-        try:
-            driver.get(url)
-            content = driver.page_source
-            soup = BeautifulSoup(content, 'lxml')
-
-            title = soup.find('h1', {'class': 'prod-ProductTitle font-normal'}).get_text()
-            logger.info("Title done %s", title)
-
-            try:
-                Cat = soup.find('ol', {'class': 'breadcrumb-list'}).get_text()
-                Categories = Cat.replace("/", ", ")
-                logger.info("categories done %s", Categories)
-            except:
-                Categories = "Not available"
-                logger.info("categories not found for %s", url)
-
-            try:
-                price = soup.find('span',
-                                  {'class': 'price display-inline-block arrange-fit price price--stylized'}).get_text()
-                logger.info("price done %s", price[:5])
-            except:
-                price = "Not available"
-                logger.info("price not found for %s", url )
-
-            try:
-                ratings = soup.find('span', {'class': 'ReviewsHeader-ratingPrefix font-bold'}).get_text()
-                logger.info("ratings done %s", ratings)            
-            except:
-                ratings = "No Rating"
-                logger.info("ratings not found for %s", url )
-
-            try:
-                add_to_cart = soup.find('div', {'class': 'prod-product-cta-add-to-cart display-inline-block'}).text
-                if add_to_cart == 'Add to cart':
-                    availability = "In Stock"
-                else:
-                    availability = "Out of Stock"
-                logger.info("availability done %s", availability)
-            except:
-                availability = "Out of Stock"
-                logger.info("availability not found for %s", url )
-
-            try:
-                feature = []
-                for feat in soup.find('div', {'class': 'about-desc about-product-description xs-margin-top'}).findAll('li'):
-                    feature.append(feat.get_text())
-                features = "".join(feature)
-                keyword = features[:10]
-                logger.info("features done ")
-
-                description = soup.find('div', {'class': 'about-desc about-product-description xs-margin-top'})
-                desc = description.text
-                dd = desc.find(keyword)
-                logger.info("descriptions done ")
-            except:
-                features = "No Information available"
-                desc[:dd] = "No Information available"
-                logger.info("feature, description not found for %s", url)
-        except:
-            logger.info("%s URL NOT PROCESSED - BAD URL", url)
+fhandler = None
+
+# fetch/parse/field timings and selector hit counts are dumped as <METRICS_PATH>.prom and <METRICS_PATH>.json
+METRICS_PATH = os.path.join(OUTPUT_DIR, 'scrape_metrics_' + time_stamp)
+
+
+# retailer name: (input csv or None, output file without extension, extraction spec). main() adds the retailers
+# of RETAILER_MODULES
+RETAILERS = {
+    'walmart': (INPUT_WALMART, OUTPUT_WALMART, SPECS['walmart']),
+    'amazon': (INPUT_AMAZON, OUTPUT_AMAZON, SPECS['amazon']),
+}
+
+
+def start_logging():
+    ''' Creates the log file of the run on first call and returns its handler'''
+    global fhandler
+    if fhandler is None:
+        fhandler = setup_logging(LOG_PATH, LOG_LEVEL, LOG_FORMAT)
+        print(LOG_PATH)
+    return fhandler
+
+
+def required_selectors(url):
+    ''' Returns the REQUIRED_SELECTORS of the url's retailer'''
+    for host, selectors in REQUIRED_SELECTORS.items():
+        if host in url:
+            return selectors
+    name = route(url)
+    return list(SPECS[name].required_selectors) if name is not None else []
+
+
+# selectors compiled by has_required_selectors, per fetch thread as the compiled XPaths of lxml are not shared
+_required = threading.local()
+
+
+def has_required_selectors(url, html):
+    ''' Checks if the raw html already contains the REQUIRED_SELECTORS of the url's retailer. The bs4 backends build
+        the whole soup, so their pages are checked on the lxml tree they are parsed with anyway'''
+    selectors = required_selectors(url)
+    if not selectors:
+        return True
+    if not html:
+        return False
+    backend = get_backend('lxml' if PARSER.startswith('bs4') else PARSER)
+    compiled = _required.__dict__.setdefault(backend.name, {})
+    doc = backend.parse(html, None)
+    for selector in selectors:
+        if selector not in compiled:
+            compiled[selector] = backend.compile(selector)
+        if not backend.select(compiled[selector], doc):
+            return False
+    return True
+
+
+def make_fetcher():
+    ''' Builds the fetcher for FETCH_MODE, going through the page cache unless CACHE is off'''
+    if FETCH_MODE == "replay":
+        return ReplayFetcher(PageCache(CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES))
+    if FETCH_MODE == "http":
+        fetcher = HttpFetcher(timeout=HTTP_TIMEOUT, pool_size=HTTP_CONCURRENCY)
+    else:
+        profile = BrowserProfile() if TRIM_BROWSER else FULL_PROFILE
+        print(DRIVER_PATH)
+        pool = BrowserPool(DRIVER_PATH, size=POOL_SIZE, page_load_timeout=PAGE_LOAD_TIMEOUT, profile=profile)
+        fetcher = BrowserFetcher(pool, wait_for=required_selectors)
+        if FETCH_MODE == "hybrid":
+            fetcher = HybridFetcher(HttpFetcher(timeout=HTTP_TIMEOUT, pool_size=HTTP_CONCURRENCY), fetcher,
+                                    has_required_selectors)
+    if not CACHE:
+        return fetcher
+    cache = PageCache(CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES)
+    return CachingFetcher(fetcher, cache, read=not INCREMENTAL and CACHE_TTL > 0)
+
+
+def input_jobs(retailers, store, index, dropped, rerun=()):
+    ''' One lazy (retailer, url) iterator per retailer input file and per mixed input file, one url per product,
+        skipping the ones finished by an earlier run unless the cached pages are replayed'''
+    jobs = []
+    for name in retailers:
+        # streaming the urls of the csv file
+        if RERUN_DEAD_LETTERS:
+            url_list = [url for retailer, url in rerun if retailer == name][:URL_LIMIT]
+        elif RETAILERS[name][0] is not None:
+            url_list = read_urls(RETAILERS[name][0], URL_LIMIT)
+        else:
             continue
+        url_list = unique_products(url_list, index, RESCRAPE_AFTER, dropped.setdefault(name, {}), SHARD)
+        if store is not None and FETCH_MODE != "replay" and not INCREMENTAL:
+            url_list = store.filter_pending(name, url_list)
+        jobs.append(zip(repeat(name), url_list))
+    for path in [] if RERUN_DEAD_LETTERS else MIXED_INPUTS:
+        # the product keys hold the retailer, the mixed urls are made unique before they are routed
+        stats = dropped.setdefault(path, {})
+        job_list = route_jobs(unique_products(read_urls(path, URL_LIMIT), index, RESCRAPE_AFTER, stats, SHARD),
+                              retailers, stats)
+        if store is not None and FETCH_MODE != "replay" and not INCREMENTAL:
+            job_list = store.filter_pending_jobs(job_list)
+        jobs.append(job_list)
+    return jobs
+
+
+def enqueue(retailers):
+    ''' Puts the jobs of the inputs in the queue of QUEUE_URL for the workers'''
+    start_logging()
+    queue = open_queue(QUEUE_URL, visibility_timeout=QUEUE_VISIBILITY_TIMEOUT)
+    index = ProductIndex(INDEX_PATH)
+    dropped = {}
+    try:
+        added = queue.put(interleave(*input_jobs(retailers, None, index, dropped)))
+        logger.info("%d jobs of %s enqueued in %s, queue %s, input urls dropped %s", added,
+                    [RETAILERS[name][0] for name in retailers if RETAILERS[name][0]] + MIXED_INPUTS, QUEUE_URL,
+                    queue.counts(retailers), dropped)
+    finally:
+        index.close()
+        queue.close()
+
+
+def scrape(retailers):
+    ''' This functions scrapes the urls of the given retailers through one shared scheduler and streams the rows
+        into one output file per retailer. In worker mode the urls are leased from the queue of QUEUE_URL'''
+    start_logging()
+
+    store = None if WORKER else CheckpointStore(CHECKPOINT_PATH)
+
+    rerun = []
+    if RERUN_DEAD_LETTERS and os.path.exists(DEAD_LETTER_PATH):
+        rerun_path = DEAD_LETTER_PATH + '.' + time_stamp
+        os.replace(DEAD_LETTER_PATH, rerun_path)
+        rerun = list(read_dead_letters(rerun_path))
+        logger.info("Rerunning %d dead letters of %s", len(rerun), rerun_path)
+
+    index = ProductIndex(INDEX_PATH)
+    dropped = {}
+    concurrency = POOL_SIZE if FETCH_MODE == "browser" else HTTP_CONCURRENCY
+    if WORKER:
+        queue = open_queue(QUEUE_URL, visibility_timeout=QUEUE_VISIBILITY_TIMEOUT)
+        jobs = LeasedJobs(queue, retailers, batch_size=max(1, concurrency // 2))
+    else:
+        jobs = interleave(*input_jobs(retailers, store, index, dropped, rerun))
+    logger.info("Inputs recieved")
 
-        # Creating the pandas dataframe of extracted details
-        if indicator == 'yes':
-            row = [[title, Categories, price[:5], ratings, availability, features, desc[:dd]]]
-            df_walmart_out = pd.DataFrame(row, columns=['Title', 'Categories', 'Price', 'Ratings', 'Availability',
-                                                        'Features', 'Description'])
-            indicator = 'no'
-            Counter = Counter + 1
+    sinks = {}
+    for name in retailers:
+        # the rows are typed by the record of the spec, the deltas of the incremental runs keep the page texts
+        spec = RETAILERS[name][2]
+        output, columns, record, text_fields = RETAILERS[name][1], spec.columns, spec.record, spec.text_fields
+        if INCREMENTAL:
+            output, columns, record, text_fields = output + '_changes', DELTA_COLUMNS, None, ()
+        path = output + '.' + OUTPUT_FORMAT
+        text_store = TextStore(text_store_path(path)) if TEXT_STORE and text_fields else None
+        # urls are checkpointed as done, or acked, only once their row is on disk
+        if WORKER:
+            on_flush = lambda urls, name=name: jobs.ack(name, urls)
         else:
-            row = [title, Categories, price[:5], ratings, availability, features, desc[:dd]]
-            df_walmart_out.loc[Counter] = row
-            Counter = Counter + 1
-        logger.info('%s completed', url)
-        logger.info('%s number of urls printed', Counter)
+            on_flush = None if FETCH_MODE == "replay" else lambda urls, name=name: store.mark_done(name, urls)
+        sinks[name] = open_sink(path, columns, fmt=OUTPUT_FORMAT, batch_size=OUTPUT_BATCH_SIZE,
+                                flush_interval=OUTPUT_FLUSH_INTERVAL, on_flush=on_flush, record=record,
+                                text_store=text_store, text_fields=text_fields)
+    counter = {name: 0 for name in retailers}
+    detector = ChangeDetector(index)
+
+    def on_row(name, url, row, missing):
+        spec = RETAILERS[name][2]
+        if INCREMENTAL:
+            deltas = detector.changes(name, spec, url, row)
+            for delta in deltas:
+                sinks[name].write(delta, key=url)
+            if not deltas:
+                sinks[name].skip(url)
+        else:
+            sinks[name].write(row, key=url)
+            index.record(name, url, row, spec.columns, spec.tracked)
+        if WORKER:
+            # the lease is kept until the row is flushed, the worker ends once all its jobs got here
+            jobs.done(name, url)
+        counter[name] = counter[name] + 1
+        logger.info('%s completed', url, extra={'retailer': name, 'missing': missing})
+        logger.info('%s number of urls printed', counter[name], extra={'retailer': name})
+
+    dead_letters = DeadLetters(DEAD_LETTER_PATH)
+
+    def on_error(name, url, failure):
+        if WORKER and failure.kind == DRIFT:
+            # the page is fine, the extractors are not: the job goes back to the queue for a worker with the fix
+            jobs.skip(name, url, str(failure))
+            logger.info("%s URL GIVEN BACK - %s", url, failure.kind.upper(),
+                        extra={'retailer': name, 'kind': failure.kind, 'error': failure.message})
+            return
+        if WORKER:
+            jobs.fail(name, url, failure)
+        elif FETCH_MODE != "replay":
+            store.mark_failed(name, [url], str(failure))
+        dead_letters.write(name, url, failure)
+        logger.info("%s URL NOT PROCESSED - %s", url, failure.kind.upper(),
+                    extra={'retailer': name, 'kind': failure.kind, 'error': failure.message,
+                           'attempts': failure.attempts})
+
+    fetcher = make_fetcher()
+    # the cached pages of the replay mode are not rate limited
+    limiter = None if FETCH_MODE == "replay" else RateLimiter(rate=DEFAULT_RATE_LIMIT, concurrency=HOST_CONCURRENCY,
+                                                                rates=RATE_LIMITS)
+    # a worker only leases the jobs it can start soon, the others stay available to the other workers
+    lookahead = 2 * concurrency if WORKER else 1024
+    scheduler = FetchScheduler(fetcher, concurrency=concurrency, limiter=limiter, retries=RETRY_POLICIES,
+                               lookahead=lookahead)
+    health = SelectorHealth({name: RETAILERS[name][2] for name in retailers}, window=HEALTH_WINDOW,
+                            min_pages=HEALTH_MIN_PAGES, threshold=HEALTH_THRESHOLD, action=HEALTH_ACTION,
+                            sample_dir=HEALTH_SAMPLE_DIR, samples=HEALTH_SAMPLES)
+    pipeline = Pipeline(scheduler, parse_workers=PARSE_WORKERS, queue_size=PAGE_QUEUE_SIZE, parser=PARSER,
+                        health=health)
+    try:
+        # the urls of a paused retailer are not fetched, the worker gives them back to the queue
+        on_skip = (lambda name, url: jobs.skip(name, url, "retailer paused")) if WORKER else None
+        pipeline.run(jobs, on_row, on_error, on_skip=on_skip)
+    finally:
+        fetcher.close()
+        # Printing the remaining rows to the output files
+        for sink in sinks.values():
+            sink.close()
+        logger.info("Printing into %s done", OUTPUT_FORMAT)
+        if WORKER:
+            # the rows are on disk and acked, the jobs left are given back to the queue
+            jobs.close()
+            logger.info("Queue %s", queue.counts(retailers))
+            queue.close()
+        else:
+            for name in retailers:
+                logger.info("%s progress %s", name, store.counts(name))
+            logger.info("Input urls dropped %s", dropped)
+            store.close()
+        if INCREMENTAL:
+            logger.info("Products %s", detector.stats)
+        logger.info("Field hit rates over the last %d pages - %s", HEALTH_WINDOW, health.summary())
+        index.close()
+        dead_letters.close()
+    if FETCH_MODE == "hybrid":
+        logger.info("Fetch paths used - %s", fetcher.summary())
+    if limiter is not None:
+        logger.info("Final rate limits - %s", limiter.summary())
+    METRICS.dump(METRICS_PATH)
+    logger.info("Metrics saved in %s", METRICS_PATH)
+
+
+def reviews():
+    ''' This functions walks the review pages of the amazon input products and streams one row per review into
+        OUTPUT_REVIEWS'''
+    start_logging()
+    index = ReviewIndex(REVIEW_INDEX_PATH)
+    # the reviews are recorded as known only once they are on disk
+    path = OUTPUT_REVIEWS + '.' + OUTPUT_FORMAT
+    text_store = TextStore(text_store_path(path)) if TEXT_STORE else None
+    sink = open_sink(path, REVIEW_COLUMNS, fmt=OUTPUT_FORMAT, batch_size=OUTPUT_BATCH_SIZE,
+                     flush_interval=OUTPUT_FLUSH_INTERVAL, on_flush=index.record, record=ReviewRecord,
+                     text_store=text_store, text_fields=REVIEW_TEXT_FIELDS)
+    # asins_of() keeps the amazon urls of the mixed inputs
+    paths = [RETAILERS['amazon'][0]] if RETAILERS['amazon'][0] is not None else []
+    urls = unique_products(chain.from_iterable(read_urls(path, URL_LIMIT) for path in paths + MIXED_INPUTS),
+                           shard=SHARD)
+    fetcher = make_fetcher()
+    concurrency = POOL_SIZE if FETCH_MODE == "browser" else HTTP_CONCURRENCY
+    limiter = None if FETCH_MODE == "replay" else RateLimiter(rate=DEFAULT_RATE_LIMIT, concurrency=HOST_CONCURRENCY,
+                                                                rates=RATE_LIMITS)
+    scheduler = FetchScheduler(fetcher, concurrency=concurrency, limiter=limiter, retries=RETRY_POLICIES)
+    try:
+        stats = scrape_reviews(asins_of(urls), scheduler, sink, index, max_pages=REVIEW_PAGES,
+                               incremental=INCREMENTAL, backend=PARSER)
+    finally:
+        fetcher.close()
+        sink.close()
+        index.close()
+    logger.info("Reviews of %d products written to %s - %s", stats['products'], sink.path, stats)
+    METRICS.dump(METRICS_PATH)
+    logger.info("Metrics saved in %s", METRICS_PATH)
 
-    # Printing output to csv file
-    df_walmart_out.to_csv(OUTPUT_WALMART, index=False)
-    logger.info("Printing into csv done")
 
-def amazon():
-    """ This functions extracts the data from amazon.com and saves the output as amazon_output.csv"""
-    indicator = "yes"
-    counter = 0
+def walmart():
+    ''' This functions extracts the data from walmart.com and saves the output as walmart_output'''
+    scrape(['walmart'])
 
-    # taking urls from the csv file
-    df_input = pd.read_csv(INPUT_AMAZON, header=None)
-    url_list = df_input[0]
-    logger.info("Inputs recieved")
-    
-    for url in url_list[:5]:
-
-        try:
-            driver.get(url)
-            content = driver.page_source
-            soup = BeautifulSoup(content, 'lxml')
-
-            title = soup.select("#productTitle")[0].get_text().strip()
-            logger.info("Title done %s", title)
-
-            try:
-                categories = []
-                for li in soup.select("#wayfinding-breadcrumbs_container ul.a-unordered-list")[0].findAll("li"):
-                    categories.append(li.get_text().strip())
-                cat = [i for i in categories if len(i) > 2]
-                categories = ", ".join(cat)
-                logger.info("categories done %s", categories)
-            except:
-                categories = "Not available"
-                logger.info("categories not found for %s", url)
-
-            try:
-                List_price = soup.find('span', {'class': 'priceBlockStrikePriceString a-text-strike'}).text.strip()
-                logger.info("list price done %s", List_price)
-            except:
-                List_price = "Not available"
-                logger.info("price not found ")
-
-            try:
-                price = soup.select("#priceblock_ourprice")[0].get_text()
-                logger.info("price done %s", price)
-            except:
-                price = "Not available"
-                logger.info("price not found ")
-
-            try:
-                rating = soup.find('span', {'class': 'a-icon-alt'}).text.strip()
-                logger.info("rating done %s", rating)
-            except:
-                rating = "Ratings not available"
-                logger.info("ratings not found for %s", url)
-
-            try:
-                availability = soup.select("#availability")[0].get_text().strip()
-                if availability == 'Available from these sellers.':
-                    availability = 'In Stock.'
-                elif len(availability) > 20:
-                    availability = 'Out of Stock.'
-                logger.info("availability done %s", availability)
-            except:
-                availability = 'No Info'
-                logger.info("availability not found for %s", url)
-                
-            try:
-                features = []
-                for li in soup.select("#feature-bullets ul.a-unordered-list")[0].findAll('li'):
-                    features.append(li.get_text().strip())
-                feature = ", ".join(features)
-                logger.info("features done")
-            except:
-                feature = "No Features"
-                logger.info("features not found for %s", url)
-                
-            try:
-                product_description = soup.select("#productDescription")[0].get_text().strip()
-                logger.info("description done ")
-            except:
-                product_description = "No Description"
-                logger.info("description not found for %s", url)
-            
-            try:
-                product_details = driver.find_element_by_xpath("(//*[@class='content'])[2]").text
-                logger.info("details done ")
-            except:
-                product_details = driver.find_element_by_xpath("(//*[@class='content'])").text
-                logger.info("details done ")
-
-            try:
-                review = []
-                for re in soup.findAll("span", {'data-hook': "review-body"}):
-                    review.append(re.get_text())
-                new_review = []
-                for i in review[:5]:
-                    ind = i.find("Read more")
-                    new_review.append(i[:ind])
-                top_review = "\n".join(new_review).replace("\n", "    ")
-                logger.info("review done ")
-            except:
-                top_review = "No Review"
-                logger.info("No review ")
-                
-
-            # Creating the pandas dataframe of extracted details
-            if indicator == 'yes':
-                row = [[title, categories, List_price, price, rating, availability, feature, product_description,
-                        product_details, top_review]]
-                df_amazon_out = pd.DataFrame(row, columns=["Title", "categories", "List_price", "price", "rating",
-                                                           "Availability", "Features", "product_description",
-                                                           "product_details", "Top_Reviews"])
-                indicator = 'no'
-                counter = counter + 1
-            else:
-                row = [title, categories, List_price, price, rating, availability, feature, product_description,
-                       product_details, top_review]
-                df_amazon_out.loc[counter] = row
-                counter = counter + 1
-            logger.info('%s completed', url)
-            logger.info('%s number of urls printed', counter)
-
-        except:
-            logger.info("%s URL NOT PROCESSED - BAD URL", url)
-            continue
-    # Printing output to csv file
-    df_amazon_out.to_csv(OUTPUT_AMAZON, index=False)
-    logger.info("Printing into csv done")
+
+def amazon():
+    """ This functions extracts the data from amazon.com and saves the output as amazon_output"""
+    scrape(['amazon'])
+
+
+def parse_shard(text):
+    ''' "i/N" -> (i, N), with 0 <= i < N'''
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected i/N, e.g. 0/4, got %r" % text)
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError("shard %r out of range, 0 <= i < N" % text)
+    return index, count
+
+
+def parse_input(text):
+    ''' "retailer=path" -> (retailer, path), a path alone is a mixed input -> (None, path)'''
+    name, _, path = text.partition('=')
+    if name not in RETAILERS or not path:
+        if not text:
+            raise argparse.ArgumentTypeError("expected <csv path> or one of %s=<csv path>" % "/".join(RETAILERS))
+        return None, text
+    return name, path
+
+
+def main(argv=None):
+    ''' Command line entry point of the scrapers, the options override the settings above'''
+    global URL_LIMIT, FETCH_MODE, HTTP_CONCURRENCY, POOL_SIZE, PARSER, PARSE_WORKERS, OUTPUT_FORMAT, SHARD
+    global INCREMENTAL, RERUN_DEAD_LETTERS, DRIVER_PATH, QUEUE_URL, WORKER, REVIEW_PAGES, OUTPUT_REVIEWS, TEXT_STORE
+    global RETAILER_MODULES, MIXED_INPUTS, HEALTH_ACTION, HEALTH_THRESHOLD, HEALTH_SAMPLE_DIR
+    global DEFAULT_RATE_LIMIT, HOST_CONCURRENCY, CACHE, CACHE_TTL
+    global CHECKPOINT_PATH, INDEX_PATH, DEAD_LETTER_PATH, REVIEW_INDEX_PATH, METRICS_PATH, CACHE_DIR, LOG_PATH
+
+    # the retailer modules are loaded first, their retailers are choices of the other options
+    modules = argparse.ArgumentParser(add_help=False)
+    modules.add_argument('--retailer-module', action='append', default=list(RETAILER_MODULES))
+    RETAILER_MODULES = modules.parse_known_args(argv)[0].retailer_module
+    load_modules(RETAILER_MODULES)
+    for name, spec in SPECS.items():
+        if name not in RETAILERS:
+            RETAILERS[name] = (None, os.path.join(OUTPUT_DIR, name + '_output_' + time_stamp), spec)
+
+    parser = argparse.ArgumentParser(description="Scrapes the product pages of the retailers into one output file "
+                                                 "per retailer")
+    parser.add_argument('--retailers', nargs='+', choices=list(RETAILERS),
+                        help="by default the retailers of the --input files, all of them without --input")
+    parser.add_argument('--input', type=parse_input, action='append', default=[], metavar='[RETAILER=]PATH',
+                        help="input csv of a retailer, urls in the first column. Repeat for several retailers. "
+                             "Without retailer the urls are mixed and routed by host")
+    parser.add_argument('--retailer-module', action='append', default=list(RETAILER_MODULES), metavar='MODULE',
+                        help="module registering another retailer, see registry.py. Repeat for several modules")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="directory of the output files")
+    parser.add_argument('--state-dir',
+                        help="directory of the checkpoint, indexes, dead letters, metrics, page cache and log. By "
+                             "default the first ones are kept in --output-dir, the cache and log in the repository")
+    parser.add_argument('--format', default=OUTPUT_FORMAT, choices=sorted(SINKS), help="output format")
+    parser.add_argument('--text-store', action='store_true', default=TEXT_STORE,
+                        help="write the large text fields to a compressed side store next to the output")
+    parser.add_argument('--limit', type=int, default=URL_LIMIT, help="urls taken from each input file")
+    parser.add_argument('--cache-ttl', type=float, default=CACHE_TTL,
+                        help="seconds a cached page is reused, 0 to fetch every page and only refresh the cache")
+    parser.add_argument('--no-cache', action='store_false', dest='cache', default=CACHE,
+                        help="neither read nor write the page cache")
+    parser.add_argument('--fetch-mode', default=FETCH_MODE, choices=['browser', 'http', 'hybrid', 'replay'])
+    parser.add_argument('--concurrency', type=int, default=HTTP_CONCURRENCY, help="http fetches in flight")
+    parser.add_argument('--browsers', type=int, default=POOL_SIZE, help="headless chrome workers")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE_LIMIT,
+                        help="requests/sec per host of the hosts not in RATE_LIMITS, e.g. the mock_retailer.py ones")
+    parser.add_argument('--host-concurrency', type=int, default=HOST_CONCURRENCY, help="fetches in flight per host")
+    parser.add_argument('--parser', default=PARSER, choices=list(BACKENDS), help="parser backend")
+    parser.add_argument('--parse-workers', type=int, default=PARSE_WORKERS, help="parser processes")
+    parser.add_argument('--shard', type=parse_shard, default=SHARD, metavar='I/N',
+                        help="scrape only the ith (from 0) of N shards of the products")
+    parser.add_argument('--incremental', action='store_true', default=INCREMENTAL,
+                        help="write only the changes of the tracked fields")
+    parser.add_argument('--rerun-dead-letters', action='store_true', default=RERUN_DEAD_LETTERS,
+                        help="take the urls of the dead-letter file as the input")
+    parser.add_argument('--driver', default=DRIVER_PATH, help="path of chromedriver")
+    parser.add_argument('--health-action', default=HEALTH_ACTION, choices=list(ACTIONS),
+                        help="what a field broken on most pages does to the crawl of its retailer")
+    parser.add_argument('--health-threshold', type=float, default=HEALTH_THRESHOLD,
+                        help="hit rate of a field below which it is taken as broken")
+    parser.add_argument('--reviews', action='store_true',
+                        help="scrape the review pages of the amazon products instead of the products")
+    parser.add_argument('--review-pages', type=int, default=REVIEW_PAGES, help="review pages walked per product")
+    parser.add_argument('--queue', default=QUEUE_URL, metavar='URL',
+                        help="job queue of the worker mode, a sqlite path or redis://host:port/db")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--enqueue', action='store_true', help="put the jobs of the inputs in the queue and exit")
+    mode.add_argument('--worker', action='store_true', default=WORKER, help="scrape the jobs leased from the queue")
+    args = parser.parse_args(argv)
+    if (args.enqueue or args.worker) and not args.queue:
+        parser.error("--enqueue and --worker need --queue")
+    if args.reviews and (args.enqueue or args.worker):
+        parser.error("--reviews does not run on the job queue")
+
+    URL_LIMIT, FETCH_MODE, OUTPUT_FORMAT, SHARD = args.limit, args.fetch_mode, args.format, args.shard
+    TEXT_STORE = args.text_store
+    HTTP_CONCURRENCY, POOL_SIZE = args.concurrency, args.browsers
+    DEFAULT_RATE_LIMIT, HOST_CONCURRENCY = args.rate, args.host_concurrency
+    CACHE, CACHE_TTL = args.cache, args.cache_ttl
+    if FETCH_MODE == "replay" and not CACHE:
+        parser.error("--fetch-mode replay needs the page cache")
+    PARSER, PARSE_WORKERS = args.parser, args.parse_workers
+    INCREMENTAL, RERUN_DEAD_LETTERS, DRIVER_PATH = args.incremental, args.rerun_dead_letters, args.driver
+    QUEUE_URL, WORKER, REVIEW_PAGES = args.queue, args.worker, args.review_pages
+    HEALTH_ACTION, HEALTH_THRESHOLD = args.health_action, args.health_threshold
+    # the state files follow the output files, so runs with other output directories do not share them
+    state_dir = args.state_dir or args.output_dir
+    os.makedirs(state_dir, exist_ok=True)
+    CHECKPOINT_PATH, INDEX_PATH, DEAD_LETTER_PATH, REVIEW_INDEX_PATH, METRICS_PATH = (
+        os.path.join(state_dir, os.path.basename(path))
+        for path in (CHECKPOINT_PATH, INDEX_PATH, DEAD_LETTER_PATH, REVIEW_INDEX_PATH, METRICS_PATH))
+    if args.state_dir:
+        CACHE_DIR = os.path.join(state_dir, 'cache')
+        LOG_PATH = os.path.join(state_dir, os.path.basename(LOG_PATH))
+    # the inputs are resolved first, the enqueue mode reads them too
+    inputs = {name: path for name, path in args.input if name is not None}
+    MIXED_INPUTS = [path for name, path in args.input if name is None] or MIXED_INPUTS
+    for name, (input_path, output, spec) in list(RETAILERS.items()):
+        RETAILERS[name] = (inputs.get(name, None if MIXED_INPUTS else input_path), output, spec)
+    retailers = args.retailers or (list(RETAILERS) if MIXED_INPUTS or not inputs else list(inputs))
+    if args.enqueue:
+        enqueue(retailers)
+        return
+
+    # the shards of one crawl, and the workers, write files of their own, merged by concatenation
+    suffix = '' if SHARD is None else '_shard%dof%d' % SHARD
+    if WORKER:
+        suffix += '_%s_%d' % (socket.gethostname(), os.getpid())
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, (input_path, _, spec) in list(RETAILERS.items()):
+        RETAILERS[name] = (input_path, os.path.join(args.output_dir, name + '_output_' + time_stamp + suffix), spec)
+    OUTPUT_REVIEWS = os.path.join(args.output_dir, 'amazon_reviews_' + time_stamp + suffix)
+    HEALTH_SAMPLE_DIR = os.path.join(args.output_dir, 'drift_samples_' + time_stamp + suffix)
+    if args.reviews:
+        reviews()
+    else:
+        scrape(retailers)
 
 
 if __name__ == "__main__":
-    walmart()
-    amazon()
-    fhandler.close()
-    
-    driver.quit()
+    main()
+    if fhandler is not None:
+        fhandler.close()
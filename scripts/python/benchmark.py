@@ -0,0 +1,305 @@
+##########################################################################################################################
+#  Purpose of this Script: Offline benchmark of the scraping engines. A local fixture server serves the saved product
+#                              pages of input/pages, so no retailer is contacted.
+#                          Every engine runs in its own process and reports pages/sec, the p50/p95/p99 latency of the
+#                              fetch, parse, extract and write stages, the peak RSS and the CPU time. The results are
+#                              saved as json under output/benchmarks to track regressions.
+#                          Engines: "serial"   - one url at a time, full BeautifulSoup tree, rows appended to a
+#                                                DataFrame and written at the end, as the original walmart()/amazon()
+#                                   "pipeline" - the FetchScheduler / process pool Pipeline / streaming sink of
+#                                                all_retailer
+
+#  Execution Instruction: python benchmark.py [--urls 200] [--engines serial pipeline] [--parser lxml] [--latency 0.05]
+#                                             [--max-rate 20 --rate 15]
+##########################################################################################################################
+
+
+# importing required libraries
+
+import argparse
+import glob
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CURRENT_DIR = os.path.abspath(os.path.dirname(__file__))
+PAGES_DIR = os.path.join(CURRENT_DIR, '..', '..', 'input', 'pages')
+RESULTS_DIR = os.path.join(CURRENT_DIR, '..', '..', 'output', 'benchmarks')
+
+ENGINES = ['serial', 'pipeline']
+
+
+# sub-resources of the pages served with `assets`: the /img/<n>.jpg of the saved pages, a web font and an ad script
+# loaded from "localhost", a third-party host for the pages served from 127.0.0.1
+ASSETS = {
+    'img': ('image/jpeg', b'\xff\xd8\xff\xe0' + bytes(40 * 1024)),
+    'fonts': ('font/woff2', b'wOF2' + bytes(60 * 1024)),
+    'ads': ('application/javascript', b'var ad = "' + b'x' * (80 * 1024) + b'";'),
+}
+ASSET_HEAD = (b'<style>@font-face {font-family: Shop; src: url(/fonts/shop.woff2)} body {font-family: Shop}</style>'
+              b'<script src="http://localhost:%d/ads/tag.js"></script></head>')
+
+
+class FixtureServer:
+    ''' Serves /<retailer>/<n> with the saved pages of the retailer in turn, after `latency` seconds.
+        With `max_rate` a retailer getting more than `max_rate` requests in a second answers 429, as the real ones.
+        With `assets` the pages also load the images, font and third-party script of ASSETS, for the browsers'''
+
+    def __init__(self, pages_dir=PAGES_DIR, latency=0.0, max_rate=None, assets=False):
+        self.pages = {}
+        for path in sorted(glob.glob(os.path.join(pages_dir, '*', '*.html'))):
+            with open(path, 'rb') as page:
+                self.pages.setdefault(os.path.basename(os.path.dirname(path)), []).append(page.read())
+        self.throttled = 0
+        pages, delay, server, recent, lock = self.pages, latency, self, {}, threading.Lock()
+
+        def over_rate(retailer):
+            now = time.monotonic()
+            with lock:
+                hits = [hit for hit in recent.get(retailer, []) if hit > now - 1] + [now]
+                recent[retailer] = hits
+                if max_rate is not None and len(hits) > max_rate:
+                    server.throttled += 1
+                    return True
+            return False
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def send_body(self, content_type, body):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parts = self.path.strip('/').split('/')
+                if assets and len(parts) == 2 and parts[0] in ASSETS:
+                    self.send_body(*ASSETS[parts[0]])
+                    return
+                if len(parts) != 2 or parts[0] not in pages or not parts[1].isdigit():
+                    self.send_error(404)
+                    return
+                if over_rate(parts[0]):
+                    self.send_error(429)
+                    return
+                time.sleep(delay)
+                body = pages[parts[0]][int(parts[1]) % len(pages[parts[0]])]
+                if assets:
+                    body = body.replace(b'</head>', ASSET_HEAD % server.port, 1)
+                self.send_body('text/html; charset=utf-8', body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.url = 'http://127.0.0.1:%d' % self.port
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def jobs(self, count):
+        ''' Returns `count` (retailer, url) jobs alternating between the retailers'''
+        retailers = sorted(self.pages)
+        return [(retailers[i % len(retailers)], '%s/%s/%d' % (self.url, retailers[i % len(retailers)], i))
+                for i in range(count)]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TimedFetcher:
+    ''' Records the seconds of every fetch of the wrapped fetcher'''
+
+    def __init__(self, fetcher, timings):
+        self.fetcher = fetcher
+        self.timings = timings
+
+    def fetch(self, url):
+        started = time.perf_counter()
+        page = self.fetcher.fetch(url)
+        self.timings.append(time.perf_counter() - started)
+        return page
+
+    def close(self):
+        self.fetcher.close()
+
+
+def percentiles(values):
+    ''' Returns the count, mean, p50, p95 and p99 of the values in milliseconds'''
+    if not values:
+        return {'count': 0}
+    if len(values) == 1:
+        values = values * 2
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {'count': len(values), 'mean_ms': 1000 * statistics.fmean(values), 'p50_ms': 1000 * cuts[49],
+            'p95_ms': 1000 * cuts[94], 'p99_ms': 1000 * cuts[98]}
+
+
+def run_serial(jobs, parser, output_dir, stages):
+    ''' The original flow: fetch, parse, extract and append to a DataFrame one url at a time'''
+    import pandas as pd
+    from extractors import compile_spec
+    from fetcher import HttpFetcher
+    from specs import SPECS
+
+    fetcher = TimedFetcher(HttpFetcher(), stages['fetch'])
+    frames = {}
+    errors = 0
+    for retailer, url in jobs:
+        try:
+            page = fetcher.fetch(url)
+            compiled = compile_spec(SPECS[retailer], parser)
+            started = time.perf_counter()
+            doc = compiled.parse(page.html)
+            parsed = time.perf_counter()
+            row, missing = compiled.extract(doc, url)
+            extracted = time.perf_counter()
+        except Exception:
+            errors = errors + 1
+            continue
+        stages['parse'].append(parsed - started)
+        stages['extract'].append(extracted - parsed)
+        if retailer not in frames:
+            frames[retailer] = pd.DataFrame([row], columns=SPECS[retailer].columns)
+        else:
+            frames[retailer].loc[len(frames[retailer])] = row
+        stages['write'].append(time.perf_counter() - extracted)
+    started = time.perf_counter()
+    for retailer, frame in frames.items():
+        frame.to_csv(os.path.join(output_dir, retailer + '.csv'), index=False)
+    stages['write'].append(time.perf_counter() - started)
+    fetcher.close()
+    return errors
+
+
+def run_pipeline(jobs, parser, output_dir, stages, concurrency, parse_workers, rate=None):
+    ''' The all_retailer flow: concurrent fetches, process pool parsers, streaming csv sinks.
+        With `rate` the fetches of every retailer go through a RateLimiter of `rate` requests/sec'''
+    from fetcher import FetchScheduler, HttpFetcher
+    from pipeline import Pipeline
+    from rate_limiter import RateLimiter
+    from sink import open_sink
+    from specs import SPECS
+
+    fetcher = TimedFetcher(HttpFetcher(pool_size=concurrency), stages['fetch'])
+    sinks = {name: open_sink(os.path.join(output_dir, name + '.csv'), spec.columns, record=spec.record)
+             for name, spec in SPECS.items()}
+    errors = []
+
+    def on_row(retailer, url, row, missing):
+        started = time.perf_counter()
+        sinks[retailer].write(row, key=url)
+        stages['write'].append(time.perf_counter() - started)
+
+    def on_timings(retailer, url, timings):
+        for stage in ('parse', 'extract'):
+            if stage in timings:
+                stages[stage].append(timings[stage])
+
+    limiter = RateLimiter(rate=rate, burst=2, concurrency=concurrency, backoff=0.5) if rate else None
+    pipeline = Pipeline(FetchScheduler(fetcher, concurrency=concurrency, limiter=limiter),
+                        parse_workers=parse_workers, parser=parser)
+    pipeline.run(jobs, on_row, lambda retailer, url, error: errors.append(error), on_timings)
+    started = time.perf_counter()
+    for sink in sinks.values():
+        sink.close()
+    stages['write'].append(time.perf_counter() - started)
+    fetcher.close()
+    return len(errors)
+
+
+def run_engine(args):
+    ''' Runs one engine in this process and returns its result'''
+    stages = {'fetch': [], 'parse': [], 'extract': [], 'write': []}
+    with FixtureServer(args.pages, args.latency, args.max_rate) as server, tempfile.TemporaryDirectory() as output_dir:
+        jobs = server.jobs(args.urls)
+        cpu_started = os.times()
+        started = time.perf_counter()
+        if args.engine == 'serial':
+            errors = run_serial(jobs, args.parser, output_dir, stages)
+        else:
+            errors = run_pipeline(jobs, args.parser, output_dir, stages, args.concurrency, args.parse_workers,
+                                  args.rate)
+        elapsed = time.perf_counter() - started
+        cpu = os.times()
+    # ru_maxrss is in KB on Linux
+    return {
+        'engine': args.engine,
+        'parser': args.parser,
+        'urls': args.urls,
+        'errors': errors,
+        'throttled': server.throttled,
+        'seconds': elapsed,
+        'pages_per_sec': (args.urls - errors) / elapsed,
+        'stages': {stage: percentiles(values) for stage, values in stages.items()},
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'peak_rss_children_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        'cpu_seconds': (cpu.user - cpu_started.user) + (cpu.system - cpu_started.system),
+        'cpu_seconds_children': ((cpu.children_user - cpu_started.children_user)
+                                 + (cpu.children_system - cpu_started.children_system)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the scraping engines")
+    parser.add_argument('--urls', type=int, default=200, help="number of urls per engine")
+    parser.add_argument('--engines', nargs='+', default=ENGINES, choices=ENGINES)
+    parser.add_argument('--parser', default='bs4', help="parser backend, see parsers.py")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds the fixture server waits per page")
+    parser.add_argument('--concurrency', type=int, default=16, help="fetches in flight for the pipeline")
+    parser.add_argument('--parse-workers', type=int, default=None, help="parser processes of the pipeline")
+    parser.add_argument('--max-rate', type=float, default=None,
+                        help="requests/sec per retailer above which the fixture server answers 429")
+    parser.add_argument('--rate', type=float, default=None, help="requests/sec per retailer of the pipeline limiter")
+    parser.add_argument('--pages', default=PAGES_DIR, help="directory of the saved pages")
+    parser.add_argument('--output', default=None, help="json result file, by default under output/benchmarks")
+    parser.add_argument('--engine', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine:
+        # child process of a single engine
+        json.dump(run_engine(args), sys.stdout)
+        return 0
+
+    results = []
+    for engine in args.engines:
+        command = [sys.executable, os.path.abspath(__file__), '--engine', engine] + sys.argv[1:]
+        completed = subprocess.run(command, capture_output=True, text=True, check=True)
+        result = json.loads(completed.stdout)
+        results.append(result)
+        print("%-10s %8.1f pages/sec  rss %6.1f MB (+%.1f MB workers)  cpu %.1fs (+%.1fs workers)  errors %d  429s %d" % (
+            engine, result['pages_per_sec'], result['peak_rss_mb'], result['peak_rss_children_mb'],
+            result['cpu_seconds'], result['cpu_seconds_children'], result['errors'], result['throttled']))
+        for stage, stats in result['stages'].items():
+            if stats['count']:
+                print("    %-8s p50 %8.2f ms  p95 %8.2f ms  p99 %8.2f ms" % (stage, stats['p50_ms'],
+                                                                          stats['p95_ms'], stats['p99_ms']))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, 'benchmark_' + datetime.now().strftime("%d_%m_%Y_%H_%M_%S") + '.json')
+    with open(output, 'w') as result_file:
+        json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'python': sys.version.split()[0],
+                   'cpu_count': os.cpu_count(), 'args': vars(args), 'results': results}, result_file, indent=2)
+    print("results saved in", output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
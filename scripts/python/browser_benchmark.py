@@ -0,0 +1,104 @@
+##########################################################################################################################
+#  Purpose of this Script: Compares the full browser profile (the original headless chrome) with the trimmed one of
+#                              browser_profile.py on the saved product pages, served by the fixture server of
+#                              benchmark.py with their images, a web font and a third-party ad script.
+#                          For every profile it reports the bytes received per page, from the devtools network events,
+#                              and the time to extract per page, from driver.get() to the extracted row. It also checks
+#                              that both profiles extract the same fields.
+#                          Needs chrome and its chromedriver.
+
+#  Execution Instruction: python browser_benchmark.py --driver <chromedriver path> [--urls 20]
+##########################################################################################################################
+
+
+# importing required libraries
+
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from benchmark import PAGES_DIR, RESULTS_DIR, FixtureServer
+from browser_profile import BrowserProfile, FULL_PROFILE, transferred_bytes
+from extractors import compile_spec
+from fetcher import BrowserPool, BrowserFetcher
+from specs import SPECS
+
+# product nodes waited for by the trimmed profile, the required selectors of the specs as in all_retailer
+WAIT_FOR = {name: list(spec.required_selectors) for name, spec in SPECS.items()}
+
+
+def run_profile(name, profile, driver_path, jobs, wait_for=None):
+    ''' Fetches and extracts the jobs with one browser of the profile, returns the bytes, seconds and rows per url'''
+    profile = copy.copy(profile)
+    profile.log_network = True
+    pool = BrowserPool(driver_path, size=1, profile=profile)
+    fetcher = BrowserFetcher(pool, wait_for=wait_for)
+    results = []
+    try:
+        # a first page to start the browser outside of the measures
+        fetcher.fetch(jobs[0][1])
+        driver = pool.acquire()
+        transferred_bytes(driver)
+        pool.release(driver)
+        for retailer, url in jobs:
+            started = time.perf_counter()
+            page = fetcher.fetch(url)
+            row, missing = compile_spec(SPECS[retailer]).extract_html(page.html, url)
+            elapsed = time.perf_counter() - started
+            driver = pool.acquire()
+            received = transferred_bytes(driver)
+            pool.release(driver)
+            results.append({'url': url, 'bytes': received, 'seconds': elapsed, 'row': row})
+    finally:
+        fetcher.close()
+    print("%-8s %10.1f KB/page  %8.1f ms/page (p50 %.1f ms)" % (
+        name, statistics.fmean(result['bytes'] for result in results) / 1024,
+        1000 * statistics.fmean(result['seconds'] for result in results),
+        1000 * statistics.median(result['seconds'] for result in results)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full vs trimmed browser profile")
+    parser.add_argument('--driver', required=True, help="path of chromedriver")
+    parser.add_argument('--urls', type=int, default=20, help="number of urls per profile")
+    parser.add_argument('--pages', default=PAGES_DIR, help="directory of the saved pages")
+    parser.add_argument('--output', default=None, help="json result file, by default under output/benchmarks")
+    args = parser.parse_args()
+
+    # "localhost" plays the third-party ad host of the served pages
+    trimmed = BrowserProfile(blocked_hosts=('localhost',))
+    with FixtureServer(args.pages, assets=True) as server:
+        jobs = server.jobs(args.urls)
+        results = {'full': run_profile('full', FULL_PROFILE, args.driver, jobs),
+                   'trimmed': run_profile('trimmed', trimmed, args.driver, jobs,
+                                          wait_for=lambda url: WAIT_FOR[url.split('/')[3]])}
+
+    different = [full['url'] for full, trim in zip(results['full'], results['trimmed']) if full['row'] != trim['row']]
+    if different:
+        print("DIFFERENT rows for", ", ".join(different))
+    summary = {name: {'bytes_per_page': statistics.fmean(result['bytes'] for result in profile_results),
+                      'ms_per_page': 1000 * statistics.fmean(result['seconds'] for result in profile_results)}
+               for name, profile_results in results.items()}
+    print("trimmed profile: %.1fx fewer bytes, %.1fx faster" % (
+        summary['full']['bytes_per_page'] / max(1, summary['trimmed']['bytes_per_page']),
+        summary['full']['ms_per_page'] / summary['trimmed']['ms_per_page']))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, 'browser_benchmark_' + datetime.now().strftime("%d_%m_%Y_%H_%M_%S") + '.json')
+    with open(output, 'w') as result_file:
+        json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'urls': args.urls, 'summary': summary,
+                   'different_rows': different}, result_file, indent=2)
+    print("results saved in", output)
+    return 1 if different else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
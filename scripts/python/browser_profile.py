@@ -0,0 +1,132 @@
+##########################################################################################################################
+#  Purpose of this Script: Chrome settings of the scraping browsers. Only the html of a product page is needed, so the
+#                              trimmed profile blocks the images, media, fonts and the ad / tracker hosts, turns off the
+#                              background features of chrome and uses the "eager" page load strategy, which returns at
+#                              DOMContentLoaded instead of waiting for every sub-resource.
+#                          The blocking goes through the devtools protocol (Network.setBlockedURLs), the url patterns
+#                              are matched by chrome before any byte is sent.
+#                          FULL_PROFILE keeps the original settings (headless only), for the comparison of
+#                              browser_benchmark.py.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import json
+import logging
+
+logger = logging.getLogger()
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico')
+MEDIA_PATTERNS = ('*.mp4', '*.webm', '*.m3u8', '*.mp3', '*.ogg')
+FONT_PATTERNS = ('*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot')
+
+# ad, tracking and analytics hosts of the retailer pages, none of them holds product data
+THIRD_PARTY_HOSTS = (
+    'doubleclick.net',
+    'googlesyndication.com',
+    'googletagmanager.com',
+    'google-analytics.com',
+    'googleadservices.com',
+    'amazon-adsystem.com',
+    'adsrvr.org',
+    'criteo.com',
+    'criteo.net',
+    'facebook.net',
+    'facebook.com',
+    'scorecardresearch.com',
+    'quantserve.com',
+    'bing.com',
+    'pinterest.com',
+    'tiktok.com',
+    'hotjar.com',
+    'crwdcntrl.net',
+    'demdex.net',
+    'omtrdc.net',
+)
+
+# chrome features which only cost time and requests in a scraping browser
+DISABLED_FEATURES = 'Translate,MediaRouter,OptimizationHints,InterestFeedContentSuggestions,AutofillServerCommunication'
+CHROME_ARGUMENTS = (
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-component-update',
+    '--disable-notifications',
+    '--disable-gpu',
+    '--disable-dev-shm-usage',
+    '--mute-audio',
+    '--no-first-run',
+    '--disable-features=' + DISABLED_FEATURES,
+    '--blink-settings=imagesEnabled=false',
+)
+
+
+class BrowserProfile:
+    ''' Options of a chrome driver and the requests it blocks.
+        `blocked_hosts` are blocked with all their sub-domains, `log_network` keeps the devtools network events
+        needed by transferred_bytes()'''
+
+    def __init__(self, block_images=True, block_media=True, block_fonts=True, blocked_hosts=THIRD_PARTY_HOSTS,
+                 page_load_strategy='eager', trim_features=True, log_network=False):
+        self.block_images = block_images
+        self.block_media = block_media
+        self.block_fonts = block_fonts
+        self.blocked_hosts = tuple(blocked_hosts)
+        self.page_load_strategy = page_load_strategy
+        self.trim_features = trim_features
+        self.log_network = log_network
+
+    def blocked_urls(self):
+        ''' Url patterns of Network.setBlockedURLs, "*" matches any text'''
+        patterns = []
+        if self.block_images:
+            patterns.extend(IMAGE_PATTERNS)
+        if self.block_media:
+            patterns.extend(MEDIA_PATTERNS)
+        if self.block_fonts:
+            patterns.extend(FONT_PATTERNS)
+        for host in self.blocked_hosts:
+            # the host and its sub-domains, with or without a port
+            patterns.extend(pattern % host for pattern in ('*://%s/*', '*://%s:*', '*.%s/*', '*.%s:*'))
+        return patterns
+
+    def options(self, headless=True):
+        from selenium import webdriver
+        option = webdriver.ChromeOptions()
+        if headless:
+            option.add_argument('headless')
+        option.page_load_strategy = self.page_load_strategy
+        if self.trim_features:
+            for argument in CHROME_ARGUMENTS:
+                if argument.startswith('--blink-settings') and not self.block_images:
+                    continue
+                option.add_argument(argument)
+        if self.block_images:
+            option.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        if self.log_network:
+            option.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        return option
+
+    def prepare(self, driver):
+        ''' Installs the blocked url patterns on a new driver'''
+        patterns = self.blocked_urls()
+        if patterns:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+
+FULL_PROFILE = BrowserProfile(block_images=False, block_media=False, block_fonts=False, blocked_hosts=(),
+                              page_load_strategy='normal', trim_features=False)
+
+
+def transferred_bytes(driver):
+    ''' Bytes received by the driver since the last call, from the devtools network events. Needs a profile with
+        `log_network`'''
+    total = 0
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        if message['method'] == 'Network.loadingFinished':
+            total += message['params'].get('encodedDataLength', 0)
+    return total
@@ -0,0 +1,110 @@
+##########################################################################################################################
+#  Purpose of this Script: Durable progress store of the scraping runs. Every (retailer, url) is recorded in a local
+#                              sqlite database as pending, done or failed with timestamps, so a restarted run skips
+#                              the finished urls and only retries the failures.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from itertools import islice, repeat
+
+logger = logging.getLogger()
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class CheckpointStore:
+    ''' Progress of every (retailer, url) kept in a sqlite database at `path`'''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS progress (
+                                  retailer TEXT NOT NULL,
+                                  url TEXT NOT NULL,
+                                  status TEXT NOT NULL,
+                                  attempts INTEGER NOT NULL DEFAULT 0,
+                                  error TEXT,
+                                  created_at TEXT NOT NULL,
+                                  updated_at TEXT NOT NULL,
+                                  PRIMARY KEY (retailer, url))""")
+
+    def status(self, retailer, url):
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM progress WHERE retailer = ? AND url = ?",
+                                     (retailer, url)).fetchone()
+        return row[0] if row else None
+
+    def filter_pending(self, retailer, urls):
+        ''' Yields the urls which are not done yet and registers the new ones as pending'''
+        for _, url in self.filter_pending_jobs(zip(repeat(retailer), urls)):
+            yield url
+
+    def filter_pending_jobs(self, jobs, chunk_size=500):
+        ''' Yields the (retailer, url) jobs which are not done yet and registers the new ones as pending. The jobs are
+            checked `chunk_size` at a time, in one transaction per chunk'''
+        skipped = {}
+        jobs = iter(jobs)
+        while True:
+            chunk = list(islice(jobs, chunk_size))
+            if not chunk:
+                break
+            stamp = now()
+            with self._lock:
+                self._conn.execute("BEGIN")
+                statuses = [self._conn.execute("SELECT status FROM progress WHERE retailer = ? AND url = ?",
+                                               job).fetchone() for job in chunk]
+                self._conn.executemany("INSERT OR IGNORE INTO progress (retailer, url, status, created_at, updated_at) "
+                                       "VALUES (?, ?, ?, ?, ?)", [(retailer, url, PENDING, stamp, stamp)
+                                                                  for (retailer, url), row in zip(chunk, statuses)
+                                                                  if row is None])
+                self._conn.execute("COMMIT")
+            for (retailer, url), row in zip(chunk, statuses):
+                skipped.setdefault(retailer, 0)
+                if row is not None and row[0] == DONE:
+                    skipped[retailer] = skipped[retailer] + 1
+                    continue
+                yield retailer, url
+        for retailer, count in skipped.items():
+            logger.info("%s %s urls already done, skipped", count, retailer)
+
+    def mark_done(self, retailer, urls):
+        self._mark(retailer, urls, DONE, None)
+
+    def mark_failed(self, retailer, urls, error):
+        self._mark(retailer, urls, FAILED, error)
+
+    def _mark(self, retailer, urls, status, error):
+        stamp = now()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT INTO progress (retailer, url, status, attempts, error, created_at, "
+                                   "updated_at) VALUES (?, ?, ?, 1, ?, ?, ?) "
+                                   "ON CONFLICT (retailer, url) DO UPDATE SET status = excluded.status, "
+                                   "attempts = attempts + 1, error = excluded.error, updated_at = excluded.updated_at",
+                                   [(retailer, url, status, error, stamp, stamp) for url in urls])
+            self._conn.execute("COMMIT")
+
+    def counts(self, retailer):
+        ''' Returns the number of urls per status for the retailer'''
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM progress WHERE retailer = ? GROUP BY status",
+                                      (retailer,)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
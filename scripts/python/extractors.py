@@ -0,0 +1,159 @@
+##########################################################################################################################
+#  Purpose of this Script: Declarative extraction of the product details. Every retailer is described by a RetailerSpec
+#                              listing its fields with their css selectors, fallbacks and post processing.
+#                          A spec is compiled once into the selectors of a parser backend (see parsers.py) and
+#                              evaluated in a single pass over the parsed page, instead of one walk of the tree per field.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Tuple
+
+from parsers import get_backend
+
+logger = logging.getLogger()
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    ''' One output column. `selector` (or the first matching of `fallbacks`) picks the node, `nth` which of the
+        matches is used (the first one when there are fewer). With `items` the texts of the matching descendants
+        are taken, with `many` the texts of all the matches; lists are passed to `post` and joined with `join`.
+        `min_hit_rate` is the share of pages below which the field is taken as broken by the selector health checks,
+        None for their default threshold and 0 for a field often missing from the pages'''
+    name: str
+    selector: str
+    fallbacks: Tuple[str, ...] = ()
+    nth: int = 0
+    items: Optional[str] = None
+    many: bool = False
+    join: str = ", "
+    strip: bool = True
+    post: Optional[Callable] = None
+    default: str = "Not available"
+    required: bool = False
+    min_hit_rate: Optional[float] = None
+
+    @property
+    def selectors(self):
+        return (self.selector,) + tuple(self.fallbacks)
+
+
+@dataclass(frozen=True)
+class RetailerSpec:
+    ''' Fields of one retailer in output order. `finalize(record)` may adjust fields depending on each other.
+        `parse_only` holds the SoupStrainer arguments of the subtrees holding all the fields, used by the
+        "bs4-strained" parser. `tracked` names the fields whose changes are reported by the incremental runs,
+        `record` is the typed record type of the output rows (see records.py), `text_fields` the large free text
+        fields written to the text store of the output when there is one (see text_store.py). `hosts` are the host
+        names of the retailer pages, routing the urls of the mixed inputs (see registry.py), and `required_selectors`
+        the nodes which must be in the raw html before the browser can be skipped, the ones of `required` fields
+        only: the browser waits for every one of them, an optional field missing from a page would cost it the
+        full wait'''
+    name: str
+    fields: Tuple[FieldSpec, ...]
+    finalize: Optional[Callable] = None
+    parse_only: Optional[dict] = None
+    tracked: Tuple[str, ...] = ()
+    record: Optional[type] = None
+    text_fields: Tuple[str, ...] = ()
+    hosts: Tuple[str, ...] = ()
+    required_selectors: Tuple[str, ...] = ()
+
+    @property
+    def columns(self):
+        return [spec.name for spec in self.fields]
+
+
+class MissingFieldError(ValueError):
+    ''' Raised when a required field is not found on the page'''
+
+    def __init__(self, field, url):
+        super().__init__("%s not found for %s" % (field, url))
+        self.field = field
+
+
+class CompiledSpec:
+    ''' A RetailerSpec with every selector compiled once for a parser backend. The backend evaluates all the page
+        selectors in one pass and the matches are dispatched to their fields'''
+
+    def __init__(self, spec, backend='bs4'):
+        self.spec = spec
+        self.backend = get_backend(backend)
+        page_selectors = []
+        for field_spec in spec.fields:
+            for selector in field_spec.selectors:
+                if selector not in page_selectors:
+                    page_selectors.append(selector)
+        self.compiled = {selector: self.backend.compile(selector) for selector in page_selectors}
+        self.union = self.backend.compile_union(page_selectors)
+        self.items = {field_spec.items: self.backend.compile(field_spec.items)
+                      for field_spec in spec.fields if field_spec.items}
+
+    def parse(self, html):
+        return self.backend.parse(html, self.spec)
+
+    def extract_html(self, html, url, timings=None):
+        return self.extract(self.parse(html), url, timings)
+
+    def extract(self, doc, url, timings=None):
+        ''' Returns the row of the parsed page in the order of the spec columns and the names of the missing fields.
+            When a `timings` dict is given the seconds spent on every field are stored in it by field name'''
+        debug = logger.isEnabledFor(logging.DEBUG)
+        matches = self.backend.match(doc, self.compiled, self.union)
+        record = {}
+        missing = []
+        for field_spec in self.spec.fields:
+            started = time.perf_counter()
+            nodes = next((matches[selector] for selector in field_spec.selectors if matches[selector]), None)
+            if not nodes:
+                if field_spec.required:
+                    raise MissingFieldError(field_spec.name, url)
+                record[field_spec.name] = field_spec.default
+                missing.append(field_spec.name)
+                if debug:
+                    logger.debug("%s not found for %s", field_spec.name, url)
+            else:
+                record[field_spec.name] = self._value(field_spec, nodes)
+                if debug:
+                    logger.debug("%s done %s", field_spec.name, record[field_spec.name][:100])
+            if timings is not None:
+                timings[field_spec.name] = time.perf_counter() - started
+        if self.spec.finalize is not None:
+            self.spec.finalize(record)
+        return [record[name] for name in self.spec.columns], missing
+
+    def _value(self, field_spec, nodes):
+        if field_spec.many:
+            value = [self._text(field_spec, node) for node in nodes]
+        else:
+            node = nodes[field_spec.nth] if len(nodes) > field_spec.nth else nodes[0]
+            if field_spec.items:
+                items = self.backend.select(self.items[field_spec.items], node)
+                value = [self._text(field_spec, item) for item in items]
+            else:
+                value = self._text(field_spec, node)
+        if field_spec.post is not None:
+            value = field_spec.post(value)
+        if isinstance(value, list):
+            value = field_spec.join.join(value)
+        return value
+
+    def _text(self, field_spec, node):
+        text = self.backend.text(node)
+        return text.strip() if field_spec.strip else text
+
+
+_compiled = {}
+
+
+def compile_spec(spec, backend='bs4'):
+    ''' Returns the CompiledSpec of the spec for the parser backend, compiling it on first use'''
+    key = (spec.name, backend)
+    if key not in _compiled or _compiled[key].spec is not spec:
+        _compiled[key] = CompiledSpec(spec, backend)
+    return _compiled[key]
@@ -0,0 +1,140 @@
+##########################################################################################################################
+#  Purpose of this Script: Failure classes of the scraping runs and their retry policies.
+#                          Every error is sorted into a kind: timeout, network, http_status, blocked, browser, parse,
+#                              missing_field, extraction_drift or unknown. The fetch errors are retried with an
+#                              exponential, jittered backoff of their kind. Parse and missing field errors give the
+#                              same result every time and are not retried, their pages stay in the page cache for a
+#                              replay.
+#                          The urls out of retries are appended to a json lines dead-letter file, which can be given
+#                              back as the input of a later run.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+TIMEOUT = 'timeout'
+NETWORK = 'network'
+HTTP_STATUS = 'http_status'
+BLOCKED = 'blocked'
+BROWSER = 'browser'
+PARSE = 'parse'
+MISSING_FIELD = 'missing_field'
+# pages of a retailer paused by the selector health checks, see selector_health.py
+DRIFT = 'extraction_drift'
+UNKNOWN = 'unknown'
+
+# exception class names of each kind, matched against the whole class hierarchy so that selenium and requests need
+# not be imported here. The first kind found wins
+ERROR_KINDS = [
+    (MISSING_FIELD, {'MissingFieldError'}),
+    (DRIFT, {'ExtractionDriftError'}),
+    (BLOCKED, {'ThrottledError'}),
+    (HTTP_STATUS, {'HttpStatusError'}),
+    (TIMEOUT, {'TimeoutException', 'Timeout', 'TimeoutError'}),
+    (BROWSER, {'WebDriverException'}),
+    (NETWORK, {'RequestException', 'ConnectionError', 'OSError'}),
+]
+
+
+class HttpStatusError(IOError):
+    ''' Raised for a page answered with an unexpected http status'''
+
+    def __init__(self, url, status):
+        super().__init__("%s answered with http status %s" % (url, status))
+        self.status = status
+
+
+def classify(error, default=UNKNOWN):
+    ''' Returns the failure kind of the exception'''
+    names = {cls.__name__ for cls in type(error).__mro__}
+    for kind, kind_names in ERROR_KINDS:
+        if names & kind_names:
+            return kind
+    return default
+
+
+class Failure(namedtuple('Failure', ['kind', 'message', 'attempts'])):
+    ''' A url given up after `attempts` attempts'''
+
+    @classmethod
+    def from_error(cls, error, attempts=1, default=UNKNOWN):
+        return cls(classify(error, default), repr(error), attempts)
+
+    def __str__(self):
+        return "%s: %s" % (self.kind, self.message)
+
+
+class RetryPolicy(namedtuple('RetryPolicy', ['retries', 'backoff', 'max_backoff'])):
+    ''' Up to `retries` retries, the nth one after `backoff` * 2^n seconds capped at `max_backoff`'''
+
+    def delay(self, attempt, rng):
+        ''' Seconds to wait before retrying after the `attempt`th attempt, None when out of retries.
+            Half of the wait is random so the retries of many urls do not come back together'''
+        if attempt > self.retries:
+            return None
+        ceiling = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return ceiling / 2 + rng.random() * ceiling / 2
+
+
+NO_RETRY = RetryPolicy(0, 0.0, 0.0)
+
+# with a rate limiter the blocked urls also wait for the pause of their host
+RETRY_POLICIES = {
+    TIMEOUT: RetryPolicy(2, 10.0, 60.0),
+    NETWORK: RetryPolicy(3, 2.0, 60.0),
+    HTTP_STATUS: RetryPolicy(2, 5.0, 60.0),
+    BLOCKED: RetryPolicy(3, 5.0, 60.0),
+    BROWSER: RetryPolicy(2, 1.0, 10.0),
+}
+
+
+def retry_delay(error, attempt, policies, rng):
+    ''' Seconds to wait before the next attempt of a url which failed with `error`, None to give up.
+        Only the 5xx statuses are retried, a 404 stays a 404'''
+    if isinstance(error, HttpStatusError) and error.status < 500:
+        return None
+    return policies.get(classify(error), NO_RETRY).delay(attempt, rng)
+
+
+class DeadLetters:
+    ''' Json lines file of the urls given up, one {"retailer", "url", "kind", "error", "attempts", "time"} per line'''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, retailer, url, failure):
+        entry = {'retailer': retailer, 'url': url, 'kind': failure.kind, 'error': failure.message,
+                 'attempts': failure.attempts, 'time': datetime.now().isoformat(timespec='seconds')}
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_dead_letters(path, kinds=None):
+    ''' Yields the (retailer, url) of a dead-letter file once each, only for the given failure kinds if any'''
+    if not os.path.exists(path):
+        return
+    seen = set()
+    with open(path, encoding='utf-8') as dead_letters:
+        for line in dead_letters:
+            entry = json.loads(line)
+            job = (entry['retailer'], entry['url'])
+            if job not in seen and (kinds is None or entry['kind'] in kinds):
+                seen.add(job)
+                yield job
@@ -0,0 +1,398 @@
+##########################################################################################################################
+#  Purpose of this Script: Fetch layer shared by the retailer scrapers. Pages are handed out either by a bounded pool of
+#                              headless chrome workers or by plain HTTP for pages that do not need javascript.
+#                          All the retailers are scheduled on one asyncio loop so the network waits of one retailer
+#                              overlap with the others instead of running back-to-back. The pace of every host is set
+#                              by the RateLimiter of rate_limiter.py.
+#                          selenium and requests are imported by the fetchers using them, when they are created, so
+#                              that a replay or an http run never loads selenium.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import asyncio
+import heapq
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count, zip_longest
+
+from browser_profile import BrowserProfile
+from failures import RETRY_POLICIES, Failure, HttpStatusError, classify, retry_delay
+from metrics import FETCH_SECONDS, PAGE_BYTES, FETCH_ERRORS, RETRIES
+from rate_limiter import ThrottledError, host_of, is_throttled
+
+logger = logging.getLogger()
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+              'Chrome/83.0.4103.97 Safari/537.36')
+
+# Result of a single fetch, `via` tells which path ("browser" or "http") produced the html
+Page = namedtuple('Page', ['url', 'html', 'status', 'via'])
+
+
+class BrowserPool:
+    ''' Bounded pool of headless chrome drivers. Drivers are started lazily and reused between urls, with the
+        settings of the BrowserProfile (by default the trimmed one of browser_profile.py).
+        A page still loading after `page_load_timeout` seconds fails with a TimeoutException'''
+
+    def __init__(self, driver_path, size=4, headless=True, page_load_timeout=60, profile=None):
+        self.driver_path = driver_path
+        self.size = size
+        self.headless = headless
+        self.page_load_timeout = page_load_timeout
+        self.profile = profile or BrowserProfile()
+        self._idle = queue.Queue()
+        self._drivers = []
+        self._lock = threading.Lock()
+
+    def _new_driver(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        driver = webdriver.Chrome(service=Service(self.driver_path), options=self.profile.options(self.headless))
+        driver.set_page_load_timeout(self.page_load_timeout)
+        self.profile.prepare(driver)
+        logger.info("Browser initiated")
+        return driver
+
+    def acquire(self):
+        ''' Returns an idle driver, starting a new one while the pool is below its size'''
+        with self._lock:
+            start_new = self._idle.empty() and len(self._drivers) < self.size
+            if start_new:
+                # reserving the slot before the slow browser start
+                self._drivers.append(None)
+        if not start_new:
+            return self._idle.get()
+        try:
+            driver = self._new_driver()
+        except Exception:
+            with self._lock:
+                self._drivers.remove(None)
+            raise
+        with self._lock:
+            self._drivers[self._drivers.index(None)] = driver
+        return driver
+
+    def release(self, driver):
+        self._idle.put(driver)
+
+    def discard(self, driver):
+        ''' Drops a crashed driver so that its slot can be restarted'''
+        with self._lock:
+            self._drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        logger.info("Browser discarded")
+
+    def close(self):
+        with self._lock:
+            drivers = [driver for driver in self._drivers if driver is not None]
+            self._drivers = []
+        for driver in drivers:
+            driver.quit()
+        logger.info("Browsers closed")
+
+
+class BrowserFetcher:
+    ''' Fetches the rendered page source through a BrowserPool.
+        With the eager page load strategy driver.get() returns at DOMContentLoaded, `wait_for(url)` gives the css
+        selectors of the product nodes to wait for, at most `wait_timeout` seconds, before the page source is taken
+        and the remaining loads of the page are stopped'''
+
+    def __init__(self, pool, wait_for=None, wait_timeout=10):
+        self.pool = pool
+        self.wait_for = wait_for
+        self.wait_timeout = wait_timeout
+
+    def _wait_for_product(self, driver, url):
+        selectors = self.wait_for(url) if self.wait_for is not None else None
+        if not selectors:
+            return
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        try:
+            WebDriverWait(driver, self.wait_timeout).until(
+                lambda driver: all(driver.find_elements(By.CSS_SELECTOR, selector) for selector in selectors))
+        except TimeoutException:
+            # the extractors report the missing fields
+            logger.debug("%s product nodes not found after %ss", url, self.wait_timeout)
+        driver.execute_script("window.stop();")
+
+    def fetch(self, url):
+        driver = self.pool.acquire()
+        try:
+            driver.get(url)
+            self._wait_for_product(driver, url)
+            html = driver.page_source
+        except Exception:
+            self.pool.discard(driver)
+            raise
+        self.pool.release(driver)
+        return Page(url, html, None, 'browser')
+
+    def close(self):
+        self.pool.close()
+
+
+class HttpFetcher:
+    ''' Fetches the server html with a plain GET, for pages which do not need javascript.
+        One keep-alive session is shared by all the threads, its pool holds `pool_size` connections per host.
+        `timeout` is the (connect, read) timeout in seconds'''
+
+    def __init__(self, timeout=(10, 30), pool_size=16):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': USER_AGENT, 'Accept-Language': 'en-US,en;q=0.9'})
+
+    def fetch(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        return Page(url, response.text, response.status_code, 'http')
+
+    def close(self):
+        self.session.close()
+
+
+class HybridFetcher:
+    ''' Tries the plain HTTP fetch first and escalates to the browser only when the response is a 200 but
+        `is_complete(url, html)` says the required selectors are missing from the raw html. The other statuses, the
+        captcha pages and the http errors are returned or raised as they are, for check_page, the rate limiter and
+        the retry policies.
+        The path used for every url is logged and summed up in `stats`'''
+
+    def __init__(self, http, browser, is_complete):
+        self.http = http
+        self.browser = browser
+        self.is_complete = is_complete
+        self.stats = {'http': [0, 0.0], 'browser': [0, 0.0], 'http_wasted': [0, 0.0]}
+        self._lock = threading.Lock()
+
+    def _record(self, path, started):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats[path][0] += 1
+            self.stats[path][1] += elapsed
+        return elapsed
+
+    def fetch(self, url):
+        started = time.perf_counter()
+        page = self.http.fetch(url)
+        if page.status != 200 or is_throttled(page) or self.is_complete(url, page.html):
+            logger.info("%s fetched via http in %.2fs (status %s)", url, self._record('http', started), page.status)
+            return page
+        self._record('http_wasted', started)
+
+        started = time.perf_counter()
+        page = self.browser.fetch(url)
+        logger.info("%s fetched via browser in %.2fs", url, self._record('browser', started))
+        return page
+
+    def summary(self):
+        ''' Returns a one line description of how many urls (and seconds) went through each path'''
+        return ", ".join("%s: %d urls in %.1fs" % (path, count, seconds)
+                         for path, (count, seconds) in self.stats.items())
+
+    def close(self):
+        self.http.close()
+        self.browser.close()
+
+
+def interleave(*jobs):
+    ''' Round-robins the (retailer, url) jobs of several retailers into one stream'''
+    for batch in zip_longest(*jobs):
+        for job in batch:
+            if job is not None:
+                yield job
+
+
+def check_page(page):
+    ''' Raises ThrottledError for the rate limit and captcha answers and HttpStatusError for the other statuses than
+        200. Pages rendered by the browser have no status'''
+    if is_throttled(page):
+        raise ThrottledError("%s was throttled (status %s)" % (page.url, page.status))
+    if page.status not in (None, 200):
+        raise HttpStatusError(page.url, page.status)
+
+
+class FetchScheduler:
+    ''' Runs (retailer, url) jobs of every retailer on one event loop with at most `concurrency` fetches in flight.
+        Jobs are pulled lazily from the iterable, so the input is never fully materialised.
+        With a RateLimiter the jobs wait in one queue per host (at most `lookahead` jobs in all) and the next fetch
+        goes to whichever host is ready first, so a throttled retailer does not hold back the others.
+        Failed fetches are retried after the backoff of the RetryPolicy of their failure kind, the urls out of
+        retries are given to `on_error` with their Failure. The jobs of the retailers for which `skip(retailer)` is
+        true are dropped before their fetch and given to `on_skip(retailer, url)`.
+        A job of None means no job is available yet (a worker waiting on its queue): the jobs already taken go on and
+        the iterable is asked again `idle_wait` seconds later at most'''
+
+    def __init__(self, fetcher, concurrency=4, limiter=None, retries=None, lookahead=1024, loop_factory=None,
+                 seed=None, idle_wait=0.2):
+        self.fetcher = fetcher
+        self.concurrency = concurrency
+        self.limiter = limiter
+        self.retries = RETRY_POLICIES if retries is None else retries
+        self.lookahead = lookahead
+        self.loop_factory = loop_factory or asyncio.new_event_loop
+        self.random = random.Random(seed)
+        self.idle_wait = idle_wait
+
+    def run(self, jobs, on_page, on_error, skip=None, on_skip=None):
+        skip = skip or (lambda retailer: False)
+        on_skip = on_skip or (lambda retailer, url: None)
+        with asyncio.Runner(loop_factory=self.loop_factory) as runner:
+            if self.limiter is None:
+                runner.run(self._run(iter(jobs), on_page, on_error, skip, on_skip))
+            else:
+                runner.run(self._run_polite(iter(jobs), on_page, on_error, skip, on_skip))
+
+    async def _fetch(self, executor, retailer, url):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            page = await loop.run_in_executor(executor, self.fetcher.fetch, url)
+        except Exception as error:
+            FETCH_ERRORS.inc(retailer=retailer, error=type(error).__name__)
+            raise
+        FETCH_SECONDS.observe(time.perf_counter() - started, retailer=retailer, via=page.via)
+        PAGE_BYTES.observe(len(page.html), retailer=retailer)
+        return page
+
+    def _retry_delay(self, retailer, url, error, attempt):
+        ''' Seconds before the next attempt, None once the url is out of retries'''
+        delay = retry_delay(error, attempt, self.retries, self.random)
+        kind = classify(error)
+        if delay is None:
+            logger.info("%s failed after %d attempts - %s: %r", url, attempt, kind, error)
+        else:
+            RETRIES.inc(retailer=retailer, kind=kind)
+            logger.info("%s attempt %d failed - %s: %r, retrying in %.1fs", url, attempt, kind, error, delay)
+        return delay
+
+    async def _run(self, jobs, on_page, on_error, skip, on_skip):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+
+            async def worker():
+                for job in jobs:
+                    if job is None:
+                        await asyncio.sleep(self.idle_wait)
+                        continue
+                    retailer, url = job
+                    attempt = 1
+                    while True:
+                        if skip(retailer):
+                            on_skip(retailer, url)
+                            break
+                        try:
+                            page = await self._fetch(executor, retailer, url)
+                            check_page(page)
+                        except Exception as error:
+                            delay = self._retry_delay(retailer, url, error, attempt)
+                            if delay is None:
+                                on_error(retailer, url, Failure.from_error(error, attempt))
+                                break
+                            await asyncio.sleep(delay)
+                            attempt += 1
+                            continue
+                        on_page(retailer, page)
+                        break
+
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+    async def _run_polite(self, jobs, on_page, on_error, skip, on_skip):
+        loop = asyncio.get_running_loop()
+        limiter = self.limiter
+        waiting = {}      # host -> deque of (retailer, url, attempt)
+        delayed = []      # heap of (due time, sequence, host, (retailer, url, attempt)) waiting for their backoff
+        sequence = count()
+        buffered = 0
+        running = set()
+        exhausted = False
+
+        async def fetch(executor, host, retailer, url, attempt):
+            released = False
+            try:
+                page = await self._fetch(executor, retailer, url)
+                limiter.release(host, loop.time(), throttled=is_throttled(page), network=page.via != 'cache')
+                released = True
+                check_page(page)
+            except Exception as error:
+                if not released:
+                    limiter.release(host, loop.time())
+                delay = self._retry_delay(retailer, url, error, attempt)
+                if delay is None:
+                    on_error(retailer, url, Failure.from_error(error, attempt))
+                else:
+                    heapq.heappush(delayed, (loop.time() + delay, next(sequence), host, (retailer, url, attempt + 1)))
+                return
+            on_page(retailer, page)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                idle = False
+                while not exhausted and buffered < self.lookahead:
+                    job = next(jobs, StopIteration)
+                    if job is StopIteration:
+                        exhausted = True
+                        break
+                    if job is None:
+                        idle = True
+                        break
+                    waiting.setdefault(host_of(job[1]), deque()).append((job[0], job[1], 1))
+                    buffered += 1
+                now = loop.time()
+                while delayed and delayed[0][0] <= now:
+                    _, _, host, job = heapq.heappop(delayed)
+                    waiting.setdefault(host, deque()).appendleft(job)
+                if exhausted and not running and not delayed and not any(waiting.values()):
+                    break
+
+                launched = False
+                next_ready = delayed[0][0] if delayed else None
+                if len(running) < self.concurrency:
+                    for host, queued in waiting.items():
+                        ready = limiter.ready_at(host, now) if queued else None
+                        if ready is None:
+                            continue
+                        if ready > now:
+                            next_ready = ready if next_ready is None else min(next_ready, ready)
+                            continue
+                        retailer, url, attempt = queued.popleft()
+                        if attempt == 1:
+                            buffered -= 1
+                        if skip(retailer):
+                            on_skip(retailer, url)
+                            launched = True
+                            break
+                        limiter.acquire(host, now)
+                        running.add(loop.create_task(fetch(executor, host, retailer, url, attempt)))
+                        # the host goes to the back of the round-robin
+                        waiting[host] = waiting.pop(host)
+                        launched = True
+                        break
+                if launched:
+                    continue
+
+                # waiting for a fetch to end, for the next host to be ready, for the next retry or for more jobs
+                timeout = None if next_ready is None else next_ready - now
+                if idle:
+                    timeout = self.idle_wait if timeout is None else min(timeout, self.idle_wait)
+                if running:
+                    done, running = await asyncio.wait(running, timeout=timeout,
+                                                       return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                else:
+                    await asyncio.sleep(timeout)
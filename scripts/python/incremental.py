@@ -0,0 +1,58 @@
+##########################################################################################################################
+#  Purpose of this Script: Incremental runs. The catalog is scraped again every day but only the changes of the
+#                              tracked fields (price, List_price, availability, rating, see `tracked` in specs.py)
+#                              matter downstream, so every new row is compared with the last one recorded for its
+#                              product key in the ProductIndex and only the deltas are written.
+#                          The hash of the whole row is compared first, an unchanged product costs one lookup and is
+#                              neither compared field by field nor serialized again. For the other ones the hashes of
+#                              the tracked fields tell which of them changed.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import time
+from datetime import datetime
+
+from product_index import field_hash, row_hash
+from urls import product_key
+
+DELTA_COLUMNS = ['product_key', 'retailer', 'url', 'field', 'change', 'old_value', 'new_value', 'scraped_at']
+
+# change types: a product not seen by an earlier run, a tracked field with a new value
+NEW = 'new'
+CHANGED = 'changed'
+
+
+class ChangeDetector:
+    ''' Compares the extracted rows with the ones last recorded in the ProductIndex and records the new ones.
+        `stats` counts the new, changed and unchanged products'''
+
+    def __init__(self, index):
+        self.index = index
+        self.stats = {NEW: 0, CHANGED: 0, 'unchanged': 0}
+
+    def changes(self, retailer, spec, url, row):
+        ''' Returns the delta rows (in DELTA_COLUMNS order) of the product, an empty list when none of its tracked
+            fields changed'''
+        key = product_key(url)
+        scraped_at = time.time()
+        content_hash = row_hash(row)
+        previous_hash = self.index.content_hash(key)
+        if previous_hash == content_hash:
+            self.stats['unchanged'] += 1
+            self.index.touch(key, scraped_at)
+            return []
+
+        values = dict(zip(spec.columns, row))
+        stamp = datetime.fromtimestamp(scraped_at).isoformat(timespec='seconds')
+        if previous_hash is None:
+            deltas = [[key, retailer, url, field, NEW, '', values[field], stamp] for field in spec.tracked]
+            self.stats[NEW] += 1
+        else:
+            old_hashes, old_values = self.index.fields(key)
+            deltas = [[key, retailer, url, field, CHANGED, old_values.get(field, ''), values[field], stamp]
+                      for field in spec.tracked if old_hashes.get(field) != field_hash(values[field])]
+            self.stats[CHANGED if deltas else 'unchanged'] += 1
+        self.index.record(retailer, url, row, spec.columns, spec.tracked, scraped_at, content_hash)
+        return deltas
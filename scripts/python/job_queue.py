@@ -0,0 +1,398 @@
+##########################################################################################################################
+#  Purpose of this Script: Shared job queue of the distributed worker mode. The (retailer, url) jobs are enqueued once,
+#                              then any number of workers on any number of machines lease them in small batches.
+#                          A lease hides its jobs from the other workers for `visibility_timeout` seconds. The worker
+#                              acks a job once its row is on disk, or fails it once it is out of retries. The jobs of a
+#                              worker which dies without acking come back to the queue when their lease expires.
+#                          Backends: SqliteQueue, a local file usable by the workers of one machine (or a shared disk),
+#                              and RedisQueue for several machines, which needs the redis package.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+logger = logging.getLogger()
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+DEAD = 'dead'
+
+# one leased job, `token` identifies the lease so that a job leased again by another worker is not acked twice
+Lease = namedtuple('Lease', ['id', 'token', 'retailer', 'url', 'attempts'])
+
+
+class SqliteQueue:
+    ''' Job queue in a sqlite database at `path`. Jobs leased `max_attempts` times are marked dead once their last
+        lease is nacked or expires'''
+
+    def __init__(self, path, visibility_timeout=600, max_attempts=5):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                                  id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                  retailer TEXT NOT NULL,
+                                  url TEXT NOT NULL,
+                                  status TEXT NOT NULL,
+                                  attempts INTEGER NOT NULL DEFAULT 0,
+                                  token TEXT,
+                                  lease_until REAL,
+                                  error TEXT,
+                                  updated_at REAL NOT NULL,
+                                  UNIQUE (retailer, url))""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, retailer, lease_until)")
+
+    def put(self, jobs, batch_size=1000):
+        ''' Enqueues the (retailer, url) jobs, the ones already in the queue are ignored. Returns the number added'''
+        added = 0
+        batch = []
+        for retailer, url in jobs:
+            batch.append((retailer, url, QUEUED, time.time()))
+            if len(batch) >= batch_size:
+                added += self._insert(batch)
+                batch = []
+        return added + self._insert(batch)
+
+    def _insert(self, batch):
+        if not batch:
+            return 0
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany("INSERT OR IGNORE INTO jobs (retailer, url, status, updated_at) VALUES (?, ?, ?, ?)",
+                                   batch)
+            self._conn.execute("COMMIT")
+            return self._conn.total_changes - before
+
+    def lease(self, count, retailers=None):
+        ''' Leases up to `count` queued or expired jobs of the retailers. The expired jobs out of attempts, whose page
+            may well crash the workers, are marked dead instead'''
+        now = time.time()
+        token = uuid.uuid4().hex
+        where = "(status = ? OR (status = ? AND lease_until < ?))"
+        params = [QUEUED, LEASED, now]
+        if retailers:
+            where += " AND retailer IN (%s)" % ", ".join("?" * len(retailers))
+            params.extend(retailers)
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock, two workers never lease the same job
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("UPDATE jobs SET status = ?, lease_until = NULL, error = ?, updated_at = ? "
+                                   "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                                   (DEAD, "lease expired %d times" % self.max_attempts, now, LEASED, now,
+                                    self.max_attempts))
+                rows = self._conn.execute("SELECT id, retailer, url, attempts FROM jobs WHERE %s ORDER BY id LIMIT ?"
+                                          % where, params + [count]).fetchall()
+                self._conn.executemany("UPDATE jobs SET status = ?, token = ?, lease_until = ?, "
+                                       "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                                       [(LEASED, token, now + self.visibility_timeout, now, row[0]) for row in rows])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [Lease(job_id, token, retailer, url, attempts + 1) for job_id, retailer, url, attempts in rows]
+
+    def extend(self, leases):
+        ''' Pushes back the visibility timeout of the leases still held'''
+        until = time.time() + self.visibility_timeout
+        self._update("UPDATE jobs SET lease_until = ? WHERE id = ? AND token = ? AND status = ?",
+                     [(until, lease.id, lease.token, LEASED) for lease in leases])
+
+    def ack(self, leases):
+        self._update("UPDATE jobs SET status = ?, lease_until = NULL, updated_at = ? WHERE id = ? AND token = ?",
+                     [(DONE, time.time(), lease.id, lease.token) for lease in leases])
+
+    def nack(self, leases, error=None):
+        ''' Gives the jobs back to the queue at once, or marks them dead after `max_attempts` leases'''
+        now = time.time()
+        self._update("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, lease_until = NULL, "
+                     "error = ?, updated_at = ? WHERE id = ? AND token = ?",
+                     [(self.max_attempts, DEAD, QUEUED, error, now, lease.id, lease.token) for lease in leases])
+
+    def fail(self, leases, error=None):
+        ''' Marks the jobs dead, they are not leased again'''
+        self._update("UPDATE jobs SET status = ?, lease_until = NULL, error = ?, updated_at = ? "
+                     "WHERE id = ? AND token = ?",
+                     [(DEAD, error, time.time(), lease.id, lease.token) for lease in leases])
+
+    def _update(self, query, rows):
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(query, rows)
+            self._conn.execute("COMMIT")
+
+    def counts(self, retailers=None):
+        ''' Number of jobs by status, the expired leases count as queued'''
+        with self._lock:
+            rows = self._conn.execute("SELECT retailer, CASE WHEN status = ? AND lease_until < ? THEN ? "
+                                      "ELSE status END, COUNT(*) FROM jobs GROUP BY 1, 2",
+                                      (LEASED, time.time(), QUEUED)).fetchall()
+        counts = {}
+        for retailer, status, count in rows:
+            if not retailers or retailer in retailers:
+                counts[status] = counts.get(status, 0) + count
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# moves the expired leases back to their pending list with one more attempt, or to the "<name>:dead" list once they
+# reach ARGV[6] attempts, then pops up to ARGV[2] jobs of the pending lists of KEYS and leases them until ARGV[1].
+# The jobs are json objects {"id", "retailer", "url", "attempts"}, the leased ones are kept in the "<name>:leased"
+# sorted set by deadline with their token in the "<name>:tokens" hash
+REDIS_LEASE = """
+local name, until, count, now, token = ARGV[3], tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[4]), ARGV[5]
+local max_attempts = tonumber(ARGV[6])
+local expired = redis.call('ZRANGEBYSCORE', name .. ':leased', '-inf', now)
+for _, job in ipairs(expired) do
+    redis.call('ZREM', name .. ':leased', job)
+    redis.call('HDEL', name .. ':tokens', job)
+    local decoded = cjson.decode(job)
+    decoded['attempts'] = decoded['attempts'] + 1
+    if decoded['attempts'] >= max_attempts then
+        decoded['error'] = 'lease expired ' .. decoded['attempts'] .. ' times'
+        redis.call('LPUSH', name .. ':dead', cjson.encode(decoded))
+    else
+        redis.call('LPUSH', name .. ':pending:' .. decoded['retailer'], cjson.encode(decoded))
+    end
+end
+local leased = {}
+for _, key in ipairs(KEYS) do
+    while #leased < count do
+        local job = redis.call('RPOP', key)
+        if not job then break end
+        redis.call('ZADD', name .. ':leased', until, job)
+        redis.call('HSET', name .. ':tokens', job, token)
+        table.insert(leased, job)
+    end
+end
+return leased
+"""
+
+
+class RedisQueue:
+    ''' Job queue in a redis server, one pending list per retailer, for workers on several machines.
+        Jobs are dropped from redis once acked, the dead ones go to the "<name>:dead" list'''
+
+    def __init__(self, url, name='scraper', visibility_timeout=600, max_attempts=5):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lease_script = self.client.register_script(REDIS_LEASE)
+
+    def _job(self, job_id, retailer, url, attempts):
+        return json.dumps({'id': job_id, 'retailer': retailer, 'url': url, 'attempts': attempts}, sort_keys=True)
+
+    def put(self, jobs, batch_size=1000):
+        added = 0
+        pipe = self.client.pipeline()
+        for retailer, url in jobs:
+            # the "seen" set keeps the queue free of duplicates
+            if self.client.sadd(self.name + ':seen', retailer + ' ' + url):
+                pipe.lpush(self.name + ':pending:' + retailer, self._job(uuid.uuid4().hex, retailer, url, 0))
+                added += 1
+                if len(pipe) >= batch_size:
+                    pipe.execute()
+        pipe.execute()
+        return added
+
+    def lease(self, count, retailers=None):
+        retailers = retailers or self._retailers()
+        now = time.time()
+        token = uuid.uuid4().hex
+        jobs = self._lease_script(keys=[self.name + ':pending:' + retailer for retailer in retailers],
+                                  args=[now + self.visibility_timeout, count, self.name, now, token,
+                                        self.max_attempts])
+        leases = []
+        for raw in jobs:
+            job = json.loads(raw)
+            leases.append(Lease(raw.decode('utf-8') if isinstance(raw, bytes) else raw, token, job['retailer'],
+                                job['url'], job['attempts'] + 1))
+        return leases
+
+    def _retailers(self):
+        prefix = self.name + ':pending:'
+        return sorted(key.decode('utf-8')[len(prefix):] for key in self.client.scan_iter(prefix + '*'))
+
+    def _held(self, lease):
+        token = self.client.hget(self.name + ':tokens', lease.id)
+        return token is not None and token.decode('utf-8') == lease.token
+
+    def _release(self, lease):
+        self.client.zrem(self.name + ':leased', lease.id)
+        self.client.hdel(self.name + ':tokens', lease.id)
+
+    def extend(self, leases):
+        until = time.time() + self.visibility_timeout
+        for lease in leases:
+            if self._held(lease):
+                self.client.zadd(self.name + ':leased', {lease.id: until}, xx=True)
+
+    def ack(self, leases):
+        for lease in leases:
+            if self._held(lease):
+                self._release(lease)
+                self.client.incr(self.name + ':done')
+
+    def nack(self, leases, error=None):
+        for lease in leases:
+            if not self._held(lease):
+                continue
+            self._release(lease)
+            job = json.loads(lease.id)
+            job['attempts'] = lease.attempts
+            if lease.attempts >= self.max_attempts:
+                job['error'] = error
+                self.client.lpush(self.name + ':dead', json.dumps(job, sort_keys=True))
+            else:
+                self.client.rpush(self.name + ':pending:' + lease.retailer, json.dumps(job, sort_keys=True))
+
+    def fail(self, leases, error=None):
+        for lease in leases:
+            if self._held(lease):
+                self._release(lease)
+                job = json.loads(lease.id)
+                job['error'] = error
+                self.client.lpush(self.name + ':dead', json.dumps(job, sort_keys=True))
+
+    def counts(self, retailers=None):
+        retailers = retailers or self._retailers()
+        return {QUEUED: sum(self.client.llen(self.name + ':pending:' + retailer) for retailer in retailers),
+                LEASED: self.client.zcard(self.name + ':leased'),
+                DONE: int(self.client.get(self.name + ':done') or 0),
+                DEAD: self.client.llen(self.name + ':dead')}
+
+    def close(self):
+        self.client.close()
+
+
+def open_queue(url, **kwargs):
+    ''' "redis://host:port/db" opens a RedisQueue, anything else ("sqlite:///path" or a path) a SqliteQueue'''
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisQueue(url, **kwargs)
+    if url.startswith('sqlite:///'):
+        url = url[len('sqlite:///'):]
+    return SqliteQueue(url, **kwargs)
+
+
+class LeasedJobs:
+    ''' The (retailer, url) jobs of a worker, leased from the queue `batch_size` at a time as the scheduler pulls them.
+        The leases held are extended by a background thread until the jobs are acked or failed.
+        When the queue has no job to lease the iteration never blocks: it yields None ("no job yet") and the scheduler
+        goes on with the jobs it has, the queue is polled again every `poll_interval` seconds. The iteration ends once
+        the queue has no job to lease and every job of this worker is done(), failed or acked, unless `wait` is set.
+        A job skipped (its retailer paused by the selector health checks) goes back to the queue and the jobs of its
+        retailer are no longer leased by this worker.
+        The jobs of a worker which died are leased again by the workers still polling once their lease expires'''
+
+    def __init__(self, queue, retailers=None, batch_size=8, poll_interval=5.0, wait=False):
+        self.queue = queue
+        self.retailers = retailers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.wait = wait
+        self.held = {}
+        # jobs handed to the scheduler and not processed yet
+        self.outstanding = set()
+        self.paused = set()
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._keeper = threading.Thread(target=self._keep_leases, name='lease-keeper', daemon=True)
+        self._keeper.start()
+
+    def __iter__(self):
+        while not self._stop.is_set():
+            with self._lock:
+                idle = not self.outstanding
+            # an idle worker checks the queue once more before it ends
+            if time.monotonic() < self._next_poll and not (idle and not self.wait):
+                yield None
+                continue
+            leases = self._lease()
+            if not leases:
+                if idle and not self.wait:
+                    return
+                self._next_poll = time.monotonic() + self.poll_interval
+                yield None
+                continue
+            self._next_poll = 0.0
+            with self._lock:
+                for lease in leases:
+                    self.held[(lease.retailer, lease.url)] = lease
+                    self.outstanding.add((lease.retailer, lease.url))
+            for lease in leases:
+                yield lease.retailer, lease.url
+
+    def _lease(self):
+        ''' Leases the next jobs, the ones of the paused retailers are given back at once'''
+        with self._lock:
+            paused = set(self.paused)
+        retailers = self.retailers
+        if retailers and paused:
+            retailers = [retailer for retailer in retailers if retailer not in paused]
+            if not retailers:
+                return []
+        leases = self.queue.lease(self.batch_size, retailers)
+        self.queue.nack([lease for lease in leases if lease.retailer in paused], "retailer paused")
+        return [lease for lease in leases if lease.retailer not in paused]
+
+    def _pop(self, retailer, urls):
+        with self._lock:
+            self.outstanding.difference_update((retailer, url) for url in urls)
+            return [lease for lease in (self.held.pop((retailer, url), None) for url in urls) if lease is not None]
+
+    def done(self, retailer, url):
+        ''' The job was processed, its lease is held until the row is on disk and acked'''
+        with self._lock:
+            self.outstanding.discard((retailer, url))
+
+    def ack(self, retailer, urls):
+        ''' Acks the jobs whose rows are on disk'''
+        self.queue.ack(self._pop(retailer, urls))
+
+    def fail(self, retailer, url, error):
+        self.queue.fail(self._pop(retailer, [url]), str(error))
+
+    def skip(self, retailer, url, error=None):
+        ''' Gives the job back to the queue, its retailer is paused and no more of its jobs are leased'''
+        with self._lock:
+            self.paused.add(retailer)
+        self.queue.nack(self._pop(retailer, [url]), error)
+
+    def _keep_leases(self):
+        while not self._stop.wait(self.queue.visibility_timeout / 3):
+            with self._lock:
+                leases = list(self.held.values())
+            try:
+                self.queue.extend(leases)
+            except Exception as error:
+                logger.info("Leases not extended: %r", error)
+
+    def close(self):
+        ''' Gives the jobs still held back to the queue'''
+        self._stop.set()
+        self._keeper.join()
+        with self._lock:
+            leases = list(self.held.values())
+            self.held = {}
+        self.queue.nack(leases, "worker stopped")
@@ -0,0 +1,46 @@
+##########################################################################################################################
+#  Purpose of this Script: Log file setup of the scraping runs. The "text" format keeps the original
+#                              '%(asctime)s - %(name)s - %(levelname)s - %(message)s' lines, the "json" format writes one
+#                              json object per line with the `extra` fields of the record.
+#                          The per-field messages of the extractors are logged at DEBUG, so they are off at the default
+#                              INFO level used in production.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import json
+import logging
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# attributes of every LogRecord, anything else was given through `extra`
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class StructuredFormatter(logging.Formatter):
+    ''' One json object per record: time, level, logger, message and the extra fields'''
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def setup_logging(path, level='INFO', fmt='text'):
+    ''' Adds a file handler at `path` to the root logger and returns it'''
+    logger = logging.getLogger()
+    fhandler = logging.FileHandler(filename=path, mode='a')
+    fhandler.setFormatter(StructuredFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+    logger.addHandler(fhandler)
+    logger.setLevel(level)
+    return fhandler
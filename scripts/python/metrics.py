@@ -0,0 +1,137 @@
+##########################################################################################################################
+#  Purpose of this Script: In-process metrics of the scraping runs: counters and histograms with labels, dumped in the
+#                              Prometheus text format or as json at the end of a run.
+#                          The metrics below are recorded by the fetch scheduler and by the pipeline with the timings
+#                              sent back by the parser workers.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import json
+import threading
+
+# seconds buckets from 1 ms to 1 minute
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# page size buckets from 10 KB to 5 MB
+SIZE_BUCKETS = (10240, 51200, 102400, 262144, 524288, 1048576, 2097152, 5242880)
+
+
+def label_text(labels):
+    return ",".join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels)
+
+
+class Counter:
+    ''' Monotonic value per label set'''
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, lock):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self._lock = lock
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in sorted(self.values.items())]
+
+    def as_json(self):
+        return [{'labels': dict(key), 'value': value} for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    ''' Bucketed distribution per label set, with the sum and count of the observed values'''
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, lock, buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+        self._lock = lock
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            if key not in self.values:
+                self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts, _, _ = entry = self.values[key]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        samples = []
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((self.name + '_bucket', key + (('le', repr(float(bound))),), cumulative))
+            samples.append((self.name + '_bucket', key + (('le', '+Inf'),), count))
+            samples.append((self.name + '_sum', key, total))
+            samples.append((self.name + '_count', key, count))
+        return samples
+
+    def as_json(self):
+        return [{'labels': dict(key), 'buckets': dict(zip(map(str, self.buckets), counts)), 'sum': total,
+                 'count': count} for key, (counts, total, count) in sorted(self.values.items())]
+
+
+class Registry:
+    ''' The set of metrics of a run'''
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text):
+        return self.metrics.setdefault(name, Counter(name, help_text, self._lock))
+
+    def histogram(self, name, help_text, buckets=TIME_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(name, help_text, self._lock, buckets))
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for metric in self.metrics.values():
+                lines.append("# HELP %s %s" % (metric.name, metric.help))
+                lines.append("# TYPE %s %s" % (metric.name, metric.kind))
+                for name, labels, value in metric.samples():
+                    lines.append("%s{%s} %s" % (name, label_text(labels), value) if labels else "%s %s" % (name, value))
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        with self._lock:
+            return json.dumps({metric.name: {'type': metric.kind, 'help': metric.help, 'samples': metric.as_json()}
+                               for metric in self.metrics.values()}, indent=2)
+
+    def dump(self, path):
+        ''' Writes <path>.prom and <path>.json'''
+        with open(path + '.prom', 'w') as prom:
+            prom.write(self.to_prometheus())
+        with open(path + '.json', 'w') as dump:
+            dump.write(self.to_json())
+
+
+METRICS = Registry()
+
+FETCH_SECONDS = METRICS.histogram('scraper_fetch_seconds', "Time to fetch a page, by retailer and fetch path")
+PAGE_BYTES = METRICS.histogram('scraper_page_bytes', "Size of the fetched html, by retailer", SIZE_BUCKETS)
+FETCH_ERRORS = METRICS.counter('scraper_fetch_errors_total', "Failed fetches, by retailer and error type")
+RETRIES = METRICS.counter('scraper_retries_total', "Retried fetches, by retailer and failure kind")
+PARSE_SECONDS = METRICS.histogram('scraper_parse_seconds', "Time to parse a page, by retailer and parser")
+EXTRACT_SECONDS = METRICS.histogram('scraper_extract_seconds', "Time to extract all the fields of a page")
+FIELD_SECONDS = METRICS.histogram('scraper_field_seconds', "Time to extract one field, by retailer and field")
+SELECTOR_RESULTS = METRICS.counter('scraper_selector_results_total',
+                                   "Field selector hits and misses, by retailer, field and result")
+PAGES = METRICS.counter('scraper_pages_total', "Processed pages, by retailer and status")
+FAILURES = METRICS.counter('scraper_failures_total', "Urls given up, by retailer and failure kind")
@@ -0,0 +1,328 @@
+##########################################################################################################################
+#  Purpose of this Script: Local mock of the retailers for load and scale tests of the full scraper, offline and
+#                              repeatable. Every retailer gets a port of its own (a host of its own for the rate
+#                              limiter) serving generated product pages with the DOM the extractors of specs.py
+#                              expect: "/ip/<slug>/<item id>" pages for walmart and "/dp/<ASIN>" pages for amazon.
+#                          The product of a url is always the same page (title, prices, rating, stock, features and
+#                              reviews are drawn from a random generator seeded by the retailer and product number),
+#                              padded with related product blocks and an inline script up to `page_kb` kB.
+#                          The server answers after `latency` seconds plus up to `jitter` seconds, a share
+#                              `error_rate` of the requests with a 503, the products of a share `missing_rate` with a
+#                              404, and with 429 (Retry-After: 1) the requests above `max_rate` per second per
+#                              retailer, like the real sites.
+
+#  Execution Instruction: python mock_retailer.py [--urls 100000] [--port 8800] [--latency 0.05 --jitter 0.05]
+#                                                 [--error-rate 0.01] [--missing-rate 0.001] [--max-rate 200]
+#                                                 [--page-kb 300]
+#                          writes one input file per retailer under input/mock and serves until Ctrl-C, then in
+#                              another terminal run the printed all_retailer.py command
+##########################################################################################################################
+
+
+# importing required libraries
+
+import argparse
+import hashlib
+import html
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CURRENT_DIR = os.path.abspath(os.path.dirname(__file__))
+INPUT_DIR = os.path.join(CURRENT_DIR, '..', '..', 'input', 'mock')
+
+RETAILERS = ('walmart', 'amazon')
+
+# path of the product pages, the number of the product is taken back from the item id / ASIN
+PRODUCT_PATHS = {
+    'walmart': re.compile(r'^/ip/[^/]+/(\d+)$'),
+    'amazon': re.compile(r'^/dp/B(\d{9})$'),
+}
+WALMART_FIRST_ITEM = 10000000
+
+WORDS = ('ultra', 'soft', 'organic', 'daily', 'classic', 'fresh', 'gentle', 'max', 'pro', 'care', 'repair', 'lotion',
+         'shampoo', 'serum', 'cream', 'wash', 'spray', 'balm', 'oil', 'mask', 'scent', 'free', 'natural', 'plus')
+CATEGORIES = (('Beauty', 'Skin Care', 'Body', 'Lotions'), ('Beauty', 'Hair Care', 'Shampoo'),
+              ('Health', 'Medicine Cabinet', 'Digestive Health'), ('Household Essentials', 'Laundry', 'Detergent'),
+              ('Baby', 'Diapering', 'Wipes'))
+
+WALMART_PAGE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>%(title)s - Walmart.com</title></head><body>
+<nav><ol class="breadcrumb-list">%(breadcrumbs)s</ol></nav>
+<div class="prod-ProductHeader"><h1 class="prod-ProductTitle prod-productTitle-buyBox font-normal">%(title)s</h1>
+<div class="ReviewsHeader"><span class="ReviewsHeader-ratingPrefix font-bold">%(rating)s</span>
+<span class="ReviewsHeader-reviewsCount">%(reviews)d ratings</span></div></div>
+<div class="prod-PriceSection"><span class="price display-inline-block arrange-fit price price--stylized">
+<span class="visuallyhidden">$%(price)s</span><span aria-hidden="true">$%(price)s</span></span></div>
+%(cart)s
+<div class="about-desc about-product-description xs-margin-top"><p>%(description)s</p><ul>%(features)s</ul></div>
+%(filler)s
+</body></html>"""
+
+WALMART_CART = '<div class="prod-product-cta-add-to-cart display-inline-block">Add to cart</div>'
+
+AMAZON_PAGE = """<!DOCTYPE html>
+<html lang="en-us"><head><meta charset="utf-8"><title>Amazon.com: %(title)s</title></head><body>
+<div id="wayfinding-breadcrumbs_container"><ul class="a-unordered-list a-horizontal">%(breadcrumbs)s</ul></div>
+<div id="titleSection"><h1 id="title"><span id="productTitle">%(title)s</span></h1></div>
+<div id="averageCustomerReviews"><span class="a-declarative"><i class="a-icon a-icon-star">
+<span class="a-icon-alt">%(rating)s out of 5 stars</span></i></span>
+<span id="acrCustomerReviewText">%(reviews)d ratings</span></div>
+<div id="price"><table class="a-lineitem">%(list_price)s
+<tr><td>Price:</td><td><span id="priceblock_ourprice" class="a-size-medium a-color-price">$%(price)s</span></td></tr>
+</table></div>
+<div id="availability"><span class="a-size-medium a-color-success">%(availability)s</span></div>
+<div id="feature-bullets"><ul class="a-unordered-list a-vertical">%(features)s</ul></div>
+<div id="productDescription"><p>%(description)s</p></div>
+<div id="detail-bullets"><div class="content"><b>Product details</b></div>
+<div class="content"><ul>%(details)s</ul></div></div>
+<div id="reviewsMedley">%(review_blocks)s</div>
+%(filler)s
+</body></html>"""
+
+AMAZON_LIST_PRICE = ('<tr><td>List Price:</td><td><span class="priceBlockStrikePriceString a-text-strike">'
+                     '$%s</span></td></tr>')
+AMAZON_REVIEW = ('<div data-hook="review" id="R%s"><span data-hook="review-body" class="review-text">'
+                 '<span>%s</span><div class="readMore">Read more</div></span></div>')
+
+
+def product_url(base, retailer, number):
+    ''' Url of the product `number` of the retailer on the mock at `base`'''
+    if retailer == 'walmart':
+        return '%s/ip/%s/%d' % (base, product_slug(retailer, number), WALMART_FIRST_ITEM + number)
+    return '%s/dp/B%09d' % (base, number)
+
+
+def product_number(retailer, path):
+    ''' Number of the product of a page path, None when the path is not a product page'''
+    match = PRODUCT_PATHS[retailer].match(path.split('?')[0])
+    if match is None:
+        return None
+    number = int(match.group(1))
+    return number - WALMART_FIRST_ITEM if retailer == 'walmart' else number
+
+
+def product_slug(retailer, number):
+    rng = random.Random('%s:%d' % (retailer, number))
+    return '-'.join(rng.choice(WORDS).capitalize() for _ in range(3))
+
+
+def product(retailer, number):
+    ''' Fields of the product `number`, the same at every call'''
+    rng = random.Random('%s:%d' % (retailer, number))
+    name = ' '.join(rng.choice(WORDS).capitalize() for _ in range(3))
+    brand = rng.choice(('Aveeno', 'Neutrogena', 'Pepcid', 'Tide', 'Pampers', 'Dove', 'Olay'))
+    price = rng.randint(199, 9999) / 100
+    features = ['%s %s for %s use' % (rng.choice(WORDS).capitalize(), rng.choice(WORDS), rng.choice(WORDS))
+                for _ in range(rng.randint(3, 7))]
+    return {
+        'title': '%s %s, %d oz' % (brand, name, rng.randint(1, 32)),
+        'categories': rng.choice(CATEGORIES),
+        'price': '%.2f' % price,
+        'list_price': '%.2f' % (price * rng.uniform(1.1, 1.5)) if rng.random() < 0.3 else None,
+        'rating': '%.1f' % rng.uniform(2.5, 5.0),
+        'reviews': rng.randint(0, 20000),
+        'in_stock': rng.random() < 0.9,
+        'features': features,
+        'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(30, 80))).capitalize() + '.',
+        'review_texts': [' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 60))).capitalize() + '.'
+                         for _ in range(rng.randint(0, 8))],
+    }
+
+
+def filler(retailer, size):
+    ''' About `size` bytes of related product blocks and inline script, none of them matched by the specs'''
+    blocks = []
+    total = 0
+    number = 0
+    while total < size // 2:
+        block = ('<div class="mock-related"><a href="%s">%s</a><span class="mock-related-price">$%d.99</span></div>'
+                 % (product_url('', retailer, number), product_slug(retailer, number), number % 90 + 9))
+        blocks.append(block)
+        total += len(block)
+        number += 1
+    script = 'var mockState = "%s";' % ('x' * max(0, size - total))
+    return '<div class="mock-carousel">%s</div><script>%s</script>' % (''.join(blocks), script)
+
+
+def render(retailer, number, padding=''):
+    ''' html of the product page `number` of the retailer'''
+    fields = product(retailer, number)
+    escape = html.escape
+    values = {'title': escape(fields['title']), 'price': fields['price'], 'rating': fields['rating'],
+              'reviews': fields['reviews'], 'description': escape(fields['description']), 'filler': padding}
+    if retailer == 'walmart':
+        values['breadcrumbs'] = '/</li>'.join('<li><a href="/cp/%d">%s</a>' % (i, escape(category))
+                                              for i, category in enumerate(fields['categories'])) + '</li>'
+        values['cart'] = WALMART_CART if fields['in_stock'] else ''
+        values['features'] = ''.join('<li>%s</li>' % escape(feature) for feature in fields['features'])
+        return WALMART_PAGE % values
+    values['breadcrumbs'] = '<li><span class="a-list-item">›</span></li>'.join(
+        '<li><span class="a-list-item"><a href="/b/%d">%s</a></span></li>' % (i, escape(category))
+        for i, category in enumerate(fields['categories']))
+    values['list_price'] = AMAZON_LIST_PRICE % fields['list_price'] if fields['list_price'] else ''
+    values['availability'] = 'In Stock.' if fields['in_stock'] else 'Currently unavailable.'
+    values['features'] = ''.join('<li><span class="a-list-item">%s</span></li>' % escape(feature)
+                                 for feature in fields['features'])
+    values['details'] = ('<li><b>Item Weight:</b> %d ounces</li><li><b>ASIN:</b> B%09d</li>'
+                         % (len(fields['features']) * 3, number))
+    values['review_blocks'] = ''.join(AMAZON_REVIEW % (hashlib.sha1(text.encode('utf-8')).hexdigest()[:13].upper(),
+                                                       escape(text))
+                                      for text in fields['review_texts'])
+    return AMAZON_PAGE % values
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 refuses connections under load
+    request_queue_size = 1024
+
+
+class MockRetailerServer:
+    ''' The mock retailers on consecutive ports from `port` (any free ports with 0). `stats` counts the answers by
+        (retailer, status). The requests per second of `max_rate` are counted on `clock`, the time() of a
+        SimulatedLoop (rate_limiter.py) for a scheduler running on one'''
+
+    def __init__(self, retailers=RETAILERS, port=0, latency=0.0, jitter=0.0, error_rate=0.0, missing_rate=0.0,
+                 max_rate=None, page_kb=100, seed=0, host='127.0.0.1', clock=time.monotonic):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.max_rate = max_rate
+        self.clock = clock
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = {retailer: deque() for retailer in retailers}
+        self._padding = {retailer: filler(retailer, max(0, page_kb * 1024 - len(render(retailer, 0))))
+                         for retailer in retailers}
+        self.servers = {}
+        for offset, retailer in enumerate(retailers):
+            self.servers[retailer] = MockHTTPServer((host, port + offset if port else 0), self._handler(retailer))
+        self.urls = {retailer: 'http://%s:%d' % (host, server.server_address[1])
+                     for retailer, server in self.servers.items()}
+        self._threads = [threading.Thread(target=server.serve_forever, name='mock-' + retailer, daemon=True)
+                         for retailer, server in self.servers.items()]
+
+    def product_urls(self, retailer, count, start=0):
+        ''' Yields the urls of `count` products of the retailer'''
+        for number in range(start, start + count):
+            yield product_url(self.urls[retailer], retailer, number)
+
+    def write_inputs(self, directory, count):
+        ''' Writes the input csv of `count` product urls of every retailer, returns {retailer: path}'''
+        os.makedirs(directory, exist_ok=True)
+        paths = {}
+        for retailer in self.servers:
+            paths[retailer] = os.path.join(directory, '%s_mock_url.csv' % retailer)
+            with open(paths[retailer], 'w', encoding='utf-8') as input_file:
+                for url in self.product_urls(retailer, count):
+                    input_file.write(url + "\n")
+        return paths
+
+    def missing(self, retailer, number):
+        ''' The products of a share `missing_rate` are not found, always the same ones'''
+        digest = hashlib.sha1(('%s:%d' % (retailer, number)).encode('utf-8')).digest()
+        return int.from_bytes(digest[:4], 'big') < self.missing_rate * 2 ** 32
+
+    def _answer(self, retailer, path):
+        ''' (status, html) of one request'''
+        number = product_number(retailer, path)
+        now = self.clock()
+        with self._lock:
+            recent = self._recent[retailer]
+            while recent and recent[0] <= now - 1:
+                recent.popleft()
+            recent.append(now)
+            throttled = self.max_rate is not None and len(recent) > self.max_rate
+            failed = self._random.random() < self.error_rate
+            delay = self.latency + self._random.random() * self.jitter
+        if number is None or self.missing(retailer, number):
+            return 404, None
+        if throttled:
+            return 429, None
+        time.sleep(delay)
+        if failed:
+            return 503, None
+        return 200, render(retailer, number, self._padding[retailer])
+
+    def _handler(self, retailer):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                status, page = server._answer(retailer, self.path)
+                with server._lock:
+                    server.stats[retailer, status] += 1
+                body = (page or '<html><body>%d</body></html>' % status).encode('utf-8')
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '1')
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves mock retailer product pages for load tests")
+    parser.add_argument('--urls', type=int, default=10000, help="product urls written per retailer")
+    parser.add_argument('--input-dir', default=INPUT_DIR, help="directory of the input csv files")
+    parser.add_argument('--port', type=int, default=8800, help="port of the first retailer, the next ones follow")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds before every answer")
+    parser.add_argument('--jitter', type=float, default=0.05, help="random seconds added to the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of the requests answered with a 503")
+    parser.add_argument('--missing-rate', type=float, default=0.0, help="share of the products answering 404")
+    parser.add_argument('--max-rate', type=float, default=None, help="requests/sec per retailer above which 429")
+    parser.add_argument('--page-kb', type=int, default=300, help="size of the product pages")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the latencies and errors")
+    args = parser.parse_args()
+
+    server = MockRetailerServer(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                missing_rate=args.missing_rate, max_rate=args.max_rate, page_kb=args.page_kb,
+                                seed=args.seed)
+    paths = server.write_inputs(args.input_dir, args.urls)
+    with server:
+        for retailer, url in server.urls.items():
+            print("%s on %s, %d urls in %s" % (retailer, url, args.urls, paths[retailer]))
+        print("python all_retailer.py --fetch-mode http %s --rate 200 --host-concurrency 32 --concurrency 64"
+              % " ".join("--input %s=%s" % item for item in paths.items()))
+        try:
+            while True:
+                time.sleep(10)
+                print(dict(server.stats))
+        except KeyboardInterrupt:
+            pass
+    print(dict(server.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+##########################################################################################################################
+#  Purpose of this Script: On-disk cache of the raw product pages, so extraction can be fixed and tuned without crawling
+#                              the retailers again.
+#                          Pages are gzip compressed and stored by the sha256 of their content, identical pages share
+#                              one file. A sqlite index maps the normalized url to the content hash.
+#                          Entries expire after `ttl` seconds and the least recently used ones are evicted once the
+#                              stored size goes over `max_bytes`.
+#                          The "replay" mode (ReplayFetcher) serves the cached pages only, without any browser.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from fetcher import Page
+from rate_limiter import is_throttled
+from urls import normalize_url
+
+logger = logging.getLogger()
+
+
+class CacheMissError(LookupError):
+    ''' Raised by the ReplayFetcher for urls which are not in the cache'''
+
+
+class PageCache:
+    ''' Content-addressed page store under `root` with TTL and size based LRU eviction'''
+
+    def __init__(self, root, ttl=None, max_bytes=None):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, 'index.sqlite'), check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+                                  key TEXT PRIMARY KEY,
+                                  hash TEXT NOT NULL,
+                                  fetched_at REAL NOT NULL,
+                                  accessed_at REAL NOT NULL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_hash ON pages (hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS blobs (
+                                  hash TEXT PRIMARY KEY,
+                                  size INTEGER NOT NULL)""")
+        # running total of the blob sizes, kept up to date by put() and evict()
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest + '.html.gz')
+
+    def get(self, url, max_age=-1):
+        ''' Returns the cached html of the url or None. Entries older than `max_age` seconds (by default the ttl,
+            None for any age) are treated as missing'''
+        max_age = self.ttl if max_age == -1 else max_age
+        key = normalize_url(url)
+        with self._lock:
+            row = self._conn.execute("SELECT hash, fetched_at FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None or (max_age is not None and time.time() - row[1] > max_age):
+                return None
+            self._conn.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        try:
+            with gzip.open(self._blob_path(row[0]), 'rt', encoding='utf-8') as blob:
+                return blob.read()
+        except OSError:
+            logger.info("cached page of %s is missing on disk", url)
+            return None
+
+    def put(self, url, html):
+        ''' Stores the html of the url and returns its content hash'''
+        data = gzip.compress(html.encode('utf-8'))
+        digest = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        path = self._blob_path(digest)
+        now = time.time()
+        # the blob is referenced by its page in the same transaction, so evict() never takes it as an orphan
+        with self._lock:
+            self._conn.execute("BEGIN")
+            added = self._conn.execute("INSERT OR IGNORE INTO blobs (hash, size) VALUES (?, ?)",
+                                       (digest, len(data))).rowcount
+            self._conn.execute("INSERT OR REPLACE INTO pages (key, hash, fetched_at, accessed_at) VALUES (?, ?, ?, ?)",
+                               (normalize_url(url), digest, now, now))
+            self._conn.execute("COMMIT")
+            self._bytes += len(data) if added else 0
+            over = self.max_bytes is not None and self._bytes > self.max_bytes
+        if added or not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # writing aside and renaming, so a crash never leaves a truncated page behind
+            partial = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+            with open(partial, 'wb') as blob:
+                blob.write(data)
+            os.replace(partial, path)
+        if over:
+            self.evict()
+        return digest
+
+    def size(self):
+        ''' Returns the stored bytes of all the pages'''
+        with self._lock:
+            return self._bytes
+
+    def evict(self):
+        ''' Drops the expired entries, then the least recently used ones until the size is under max_bytes'''
+        with self._lock:
+            self._conn.execute("BEGIN")
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM pages WHERE fetched_at < ?", (time.time() - self.ttl,))
+            if self.max_bytes is not None:
+                # the 10% margin avoids evicting again on the next put
+                target = self.max_bytes * 0.9
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+                rows = self._conn.execute("SELECT p.key, b.size, (SELECT COUNT(*) FROM pages o WHERE o.hash = p.hash) "
+                                          "FROM pages p JOIN blobs b ON b.hash = p.hash ORDER BY p.accessed_at")
+                evicted = []
+                for key, size, references in rows:
+                    if total <= target:
+                        break
+                    evicted.append((key,))
+                    if references == 1:
+                        total -= size
+                self._conn.executemany("DELETE FROM pages WHERE key = ?", evicted)
+            orphans = self._conn.execute("SELECT hash FROM blobs WHERE hash NOT IN (SELECT hash FROM pages)").fetchall()
+            self._conn.executemany("DELETE FROM blobs WHERE hash = ?", orphans)
+            self._conn.execute("COMMIT")
+            self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            # removed under the lock, a put() of the same page afterwards writes its file again
+            for (digest,) in orphans:
+                try:
+                    os.remove(self._blob_path(digest))
+                except OSError:
+                    pass
+        logger.info("%s cached pages evicted", len(orphans))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachingFetcher:
+    ''' Serves fresh pages from the cache and stores the successful fetches of the wrapped fetcher. With `read`
+        False every page is fetched and the cache is only refreshed'''
+
+    def __init__(self, fetcher, cache, read=True):
+        self.fetcher = fetcher
+        self.cache = cache
+        self.read = read
+
+    def fetch(self, url):
+        html = self.cache.get(url) if self.read else None
+        if html is not None:
+            return Page(url, html, 200, 'cache')
+        page = self.fetcher.fetch(url)
+        if page.status in (None, 200) and not is_throttled(page):
+            self.cache.put(url, page.html)
+        return page
+
+    def close(self):
+        self.fetcher.close()
+        self.cache.close()
+
+    def __getattr__(self, name):
+        # summary() and the other helpers of the wrapped fetcher
+        return getattr(self.fetcher, name)
+
+
+class ReplayFetcher:
+    ''' Serves the cached pages whatever their age and never goes to the network'''
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def fetch(self, url):
+        html = self.cache.get(url, max_age=None)
+        if html is None:
+            raise CacheMissError("%s is not in the page cache" % url)
+        return Page(url, html, 200, 'cache')
+
+    def close(self):
+        self.cache.close()
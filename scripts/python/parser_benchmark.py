@@ -0,0 +1,86 @@
+##########################################################################################################################
+#  Purpose of this Script: Compares the parser backends of parsers.py on the saved product pages under input/pages.
+#                          For every page and backend it reports the parse and extract time per page, and checks that
+#                              every field is equal to the one given by the reference "bs4" backend.
+
+#  Execution Instruction: python parser_benchmark.py [--repeat 20] [--parsers bs4 bs4-strained lxml selectolax]
+##########################################################################################################################
+
+
+# importing required libraries
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+from extractors import compile_spec
+from parsers import BACKENDS
+from specs import SPECS
+
+CURRENT_DIR = os.path.abspath(os.path.dirname(__file__))
+PAGES_DIR = os.path.join(CURRENT_DIR, '..', '..', 'input', 'pages')
+
+
+def saved_pages(pages_dir):
+    ''' Yields (retailer, path) of the saved pages, stored as <pages_dir>/<retailer>/<product id>.html'''
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*', '*.html'))):
+        retailer = os.path.basename(os.path.dirname(path))
+        if retailer in SPECS:
+            yield retailer, path
+
+
+def time_backend(compiled, html, url, repeat):
+    ''' Returns the best parse and extract times in seconds over `repeat` runs, and the extracted row'''
+    best_parse = best_extract = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        doc = compiled.parse(html)
+        parsed = time.perf_counter()
+        row, missing = compiled.extract(doc, url)
+        best_parse = min(best_parse, parsed - started)
+        best_extract = min(best_extract, time.perf_counter() - parsed)
+    return best_parse, best_extract, row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse and extract time of every parser backend on the saved pages")
+    parser.add_argument('--pages', default=PAGES_DIR, help="directory of the saved pages")
+    parser.add_argument('--repeat', type=int, default=20, help="runs per page, the best one is reported")
+    parser.add_argument('--parsers', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    args = parser.parse_args()
+
+    mismatches = 0
+    totals = {}
+    print("%-12s %-14s %10s %12s %12s %s" % ("retailer", "parser", "size KB", "parse ms", "extract ms", "fields"))
+    for retailer, path in saved_pages(args.pages):
+        with open(path, encoding='utf-8') as page:
+            html = page.read()
+        reference = None
+        for name in ['bs4'] + [name for name in args.parsers if name != 'bs4']:
+            try:
+                compiled = compile_spec(SPECS[retailer], name)
+            except ImportError as error:
+                print("%-12s %-14s skipped: %s" % (retailer, name, error))
+                continue
+            parse_time, extract_time, row = time_backend(compiled, html, path, args.repeat)
+            if reference is None:
+                reference = row
+            different = [column for column, value, expected in zip(compiled.spec.columns, row, reference)
+                         if value != expected]
+            mismatches += len(different)
+            totals.setdefault(name, []).append(parse_time + extract_time)
+            fields = "equal" if not different else "DIFFERENT: " + ", ".join(different)
+            print("%-12s %-14s %10.1f %12.2f %12.2f %s" % (retailer, name, len(html) / 1024, parse_time * 1000,
+                                                         extract_time * 1000, fields))
+
+    print()
+    for name, times in totals.items():
+        print("%-14s %.2f ms per page, %.1fx the bs4 speed" % (name, 1000 * sum(times) / len(times),
+                                                              sum(totals['bs4']) / sum(times)))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
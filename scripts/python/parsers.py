@@ -0,0 +1,140 @@
+##########################################################################################################################
+#  Purpose of this Script: Parser backends used by the extractor specs. Every backend parses the html, compiles the css
+#                              selectors once and returns the text and attributes of the matched nodes:
+#                          "bs4"          - full BeautifulSoup tree with soupsieve, the reference behaviour
+#                          "bs4-strained" - BeautifulSoup building only the subtrees listed in the spec `parse_only`
+#                          "lxml"         - lxml.html tree with the selectors translated once to compiled XPath
+#                          "selectolax"   - selectolax (lexbor) tree, only when selectolax is installed
+#                          Every backend imports its parser library when it is first used.
+##########################################################################################################################
+
+
+class Bs4Backend:
+    ''' BeautifulSoup tree, all the page selectors are joined into one selector list so the tree is walked once'''
+
+    name = 'bs4'
+    strained = False
+
+    def __init__(self):
+        import soupsieve
+        from bs4 import BeautifulSoup, SoupStrainer
+        self._soup, self._strainer, self._sv = BeautifulSoup, SoupStrainer, soupsieve
+
+    def parse(self, html, spec):
+        if self.strained and spec.parse_only:
+            return self._soup(html, 'lxml', parse_only=self._strainer(**spec.parse_only))
+        return self._soup(html, 'lxml')
+
+    def compile(self, selector):
+        return self._sv.compile(selector)
+
+    def compile_union(self, selectors):
+        return self._sv.compile(", ".join(selectors))
+
+    def match(self, doc, compiled, union):
+        matches = {selector: [] for selector in compiled}
+        for node in union.select(doc):
+            for selector, pattern in compiled.items():
+                if pattern.match(node):
+                    matches[selector].append(node)
+        return matches
+
+    def select(self, pattern, node):
+        return pattern.select(node)
+
+    def text(self, node):
+        return node.get_text()
+
+    def attribute(self, node, name):
+        value = node.get(name)
+        return " ".join(value) if isinstance(value, list) else value
+
+
+class StrainedBs4Backend(Bs4Backend):
+    ''' BeautifulSoup tree limited to the spec `parse_only` subtrees, the rest of the page is never built'''
+
+    name = 'bs4-strained'
+    strained = True
+
+
+class LxmlBackend:
+    ''' lxml.html tree, every css selector is translated once into a compiled XPath evaluated in C'''
+
+    name = 'lxml'
+
+    def __init__(self):
+        import lxml.html
+        from cssselect import HTMLTranslator
+        from lxml import etree
+        self._html, self._etree, self.translator = lxml.html, etree, HTMLTranslator()
+
+    def parse(self, html, spec):
+        return self._html.document_fromstring(html)
+
+    def compile(self, selector):
+        return self._etree.XPath(self.translator.css_to_xpath(selector))
+
+    def compile_union(self, selectors):
+        return None
+
+    def match(self, doc, compiled, union):
+        return {selector: xpath(doc) for selector, xpath in compiled.items()}
+
+    def select(self, xpath, node):
+        return xpath(node)
+
+    def text(self, node):
+        return node.text_content()
+
+    def attribute(self, node, name):
+        return node.get(name)
+
+
+class SelectolaxBackend:
+    ''' selectolax tree, selectors are handed as strings to lexbor which caches their compiled form'''
+
+    name = 'selectolax'
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+
+    def parse(self, html, spec):
+        return self._parser(html)
+
+    def compile(self, selector):
+        return selector
+
+    def compile_union(self, selectors):
+        return None
+
+    def match(self, doc, compiled, union):
+        return {selector: doc.css(selector) for selector in compiled}
+
+    def select(self, selector, node):
+        return node.css(selector)
+
+    def text(self, node):
+        return node.text(deep=True)
+
+    def attribute(self, node, name):
+        return node.attributes.get(name)
+
+
+BACKENDS = {
+    'bs4': Bs4Backend,
+    'bs4-strained': StrainedBs4Backend,
+    'lxml': LxmlBackend,
+    'selectolax': SelectolaxBackend,
+}
+
+_backends = {}
+
+
+def get_backend(name):
+    ''' Returns the shared instance of the backend, raising ValueError for unknown names'''
+    if name not in BACKENDS:
+        raise ValueError("Unknown parser %r, expected one of %s" % (name, ", ".join(BACKENDS)))
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
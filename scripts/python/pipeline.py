@@ -0,0 +1,165 @@
+##########################################################################################################################
+#  Purpose of this Script: Scraping pipeline with the fetching decoupled from the parsing. The fetchers put the raw html
+#                              on a bounded queue, a process pool of parser workers runs the extractor specs and the
+#                              calling thread consumes the rows, so parsing uses every core and never blocks a fetch.
+#                          The queues and the number of parses in flight are bounded, a slow stage makes the stages
+#                              before it wait and the memory stays flat whatever the number of urls.
+#                          With a SelectorHealth every parsed page feeds the hit rates of the fields, the retailers
+#                              with broken selectors are no longer fetched (see selector_health.py).
+##########################################################################################################################
+
+
+# importing required libraries
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import takewhile
+
+from extractors import MissingFieldError, compile_spec
+from failures import DRIFT, PARSE, Failure
+from metrics import PARSE_SECONDS, EXTRACT_SECONDS, FIELD_SECONDS, SELECTOR_RESULTS, PAGES, FAILURES
+from registry import MODULES, load_modules
+from specs import SPECS
+
+logger = logging.getLogger()
+
+
+def parse_page(retailer, url, html, parser):
+    ''' Parser worker, runs in the process pool. Returns (retailer, url, row, missing fields, Failure, timings)
+        where timings holds the parse and extract seconds and the seconds of every field under "fields". A missing
+        required field gives its Failure with the field as the missing one'''
+    timings = {}
+    try:
+        compiled = compile_spec(SPECS[retailer], parser)
+        started = time.perf_counter()
+        doc = compiled.parse(html)
+        parsed = time.perf_counter()
+        timings['parse'] = parsed - started
+        timings['fields'] = {}
+        row, missing = compiled.extract(doc, url, timings['fields'])
+        timings['extract'] = time.perf_counter() - parsed
+    except MissingFieldError as error:
+        return retailer, url, None, [error.field], Failure.from_error(error, default=PARSE), timings
+    except Exception as error:
+        return retailer, url, None, None, Failure.from_error(error, default=PARSE), timings
+    return retailer, url, row, missing, None, timings
+
+
+class Pipeline:
+    ''' fetch (FetchScheduler) -> bounded page queue -> process pool parsers -> rows handed to the caller'''
+
+    def __init__(self, scheduler, parse_workers=None, queue_size=64, parser='bs4', health=None):
+        self.scheduler = scheduler
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.parser = parser
+        self.health = health
+
+    def record(self, retailer, row, missing, error, timings):
+        ''' Records the metrics of one processed page'''
+        if 'parse' in timings:
+            PARSE_SECONDS.observe(timings['parse'], retailer=retailer, parser=self.parser)
+        if 'extract' in timings:
+            EXTRACT_SECONDS.observe(timings['extract'], retailer=retailer, parser=self.parser)
+        for field, seconds in timings.get('fields', {}).items():
+            FIELD_SECONDS.observe(seconds, retailer=retailer, field=field)
+        if error is not None:
+            PAGES.inc(retailer=retailer, status='failed')
+            FAILURES.inc(retailer=retailer, kind=error.kind)
+            return
+        PAGES.inc(retailer=retailer, status='done')
+        for field in SPECS[retailer].columns:
+            SELECTOR_RESULTS.inc(retailer=retailer, field=field, result='miss' if field in missing else 'hit')
+
+    def run(self, jobs, on_row, on_error, on_timings=None, on_skip=None):
+        ''' Scrapes the (retailer, url) jobs. `on_row(retailer, url, row, missing)`, `on_error(retailer, url, failure)`
+            and `on_timings(retailer, url, timings)` with the parse and extract seconds are called from the
+            calling thread. The pages of a retailer halted by the selector health checks go to `on_error` with a
+            DRIFT failure, its jobs left are not fetched and go to `on_skip(retailer, url)`, called from the fetch
+            thread'''
+        health = self.health
+        if health is not None:
+            # an aborted crawl stops reading its input, the jobs already read are skipped by the scheduler
+            jobs = takewhile(lambda job: not health.aborted, jobs)
+        pages = queue.Queue(maxsize=self.queue_size)
+        results = queue.Queue(maxsize=self.queue_size)
+        failures = []
+
+        def fetch_stage():
+            # blocking on the full page queue holds the scheduler back until the parsers catch up
+            try:
+                self.scheduler.run(jobs, lambda retailer, page: pages.put((retailer, page)),
+                                   lambda retailer, url, failure: results.put(
+                                       ((retailer, url, None, None, failure, {}), None)),
+                                   skip=health.halted if health is not None else None, on_skip=on_skip)
+            except Exception as error:
+                failures.append(error)
+            finally:
+                pages.put(None)
+
+        def parse_stage():
+            in_flight = threading.BoundedSemaphore(self.parse_workers * 2)
+            try:
+                # the workers load the retailer modules of the registry, for their specs
+                with ProcessPoolExecutor(max_workers=self.parse_workers, initializer=load_modules,
+                                         initargs=(tuple(MODULES),)) as pool:
+                    while True:
+                        item = pages.get()
+                        if item is None:
+                            break
+                        retailer, page = item
+                        in_flight.acquire()
+                        future = pool.submit(parse_page, retailer, page.url, page.html, self.parser)
+                        future.add_done_callback(lambda future, retailer=retailer, page=page:
+                                                 collect(future, retailer, page, in_flight))
+            except Exception as error:
+                failures.append(error)
+                # draining the page queue so the fetch stage is not left blocked
+                while pages.get() is not None:
+                    pass
+            finally:
+                results.put(None)
+
+        def collect(future, retailer, page, in_flight):
+            try:
+                result = future.result()
+            except Exception as error:
+                result = (retailer, page.url, None, None, Failure.from_error(error, default=PARSE), {})
+            in_flight.release()
+            # the html goes along for the failing page samples of the selector health
+            results.put((result, page.html if health is not None else None))
+
+        stages = [threading.Thread(target=fetch_stage, name='fetch-stage', daemon=True),
+                  threading.Thread(target=parse_stage, name='parse-stage', daemon=True)]
+        for stage in stages:
+            stage.start()
+
+        # writer stage
+        while True:
+            item = results.get()
+            if item is None:
+                break
+            (retailer, url, row, missing, error, timings), html = item
+            if health is not None and html is not None and missing is not None:
+                health.observe(retailer, url, missing, html, complete=error is None)
+            if health is not None and health.halted(retailer) and error is None:
+                error = Failure(DRIFT, "%s selectors broken: %s" % (retailer, sorted(health.broken[retailer]))
+                                if health.broken.get(retailer) else "crawl aborted", 1)
+            self.record(retailer, row, missing, error, timings)
+            if timings and on_timings is not None:
+                on_timings(retailer, url, timings)
+            if error is not None:
+                on_error(retailer, url, error)
+            else:
+                on_row(retailer, url, row, missing)
+
+        for stage in stages:
+            stage.join()
+        if failures:
+            raise failures[0]
+        if health is not None:
+            health.check()
@@ -0,0 +1,150 @@
+##########################################################################################################################
+#  Purpose of this Script: Input stage of the scraping runs and on-disk index of the scraped products.
+#                          The input urls are streamed, reduced to their canonical product key (urls.product_key) and
+#                              the repeated keys are dropped, so one product is fetched once per run whatever the
+#                              query strings of its urls. A crawl split in shards keeps the keys of its shard only,
+#                              the outputs of the shards never share a product.
+#                          The sqlite index keeps for every key the last url scraped, the time of the last scrape,
+#                              the hash of the extracted row, the hash of every field and the values of the fields
+#                              tracked by the incremental runs (incremental.py).
+##########################################################################################################################
+
+
+# importing required libraries
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from urls import product_key, shard_of
+
+logger = logging.getLogger()
+
+
+def row_hash(row):
+    ''' Hash of the extracted values of a row'''
+    return hashlib.sha1(json.dumps(list(row), ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+def field_hash(value):
+    return hashlib.sha1(str(value).encode('utf-8')).hexdigest()[:16]
+
+
+class ProductIndex:
+    ''' key -> (retailer, url, last scraped time, content hash) of the scraped products, in a sqlite database at `path`,
+        with the json {field: hash} of the fields and {field: value} of the tracked fields.
+        The updates are written in batches of `batch_size`'''
+
+    def __init__(self, path, batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._touched = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS products (
+                                  key TEXT PRIMARY KEY,
+                                  retailer TEXT NOT NULL,
+                                  url TEXT NOT NULL,
+                                  scraped_at REAL NOT NULL,
+                                  content_hash TEXT NOT NULL,
+                                  field_hashes TEXT,
+                                  tracked TEXT)""")
+        # indexes created before the field hashes
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(products)")}
+        for column in ('field_hashes', 'tracked'):
+            if column not in columns:
+                self._conn.execute("ALTER TABLE products ADD COLUMN %s TEXT" % column)
+
+    def get(self, key):
+        ''' Returns (retailer, url, scraped_at, content_hash) of the key, None for an unknown key'''
+        with self._lock:
+            return self._conn.execute("SELECT retailer, url, scraped_at, content_hash FROM products WHERE key = ?",
+                                      (key,)).fetchone()
+
+    def scraped_since(self, key, since):
+        with self._lock:
+            row = self._conn.execute("SELECT scraped_at FROM products WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] >= since
+
+    def content_hash(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT content_hash FROM products WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def fields(self, key):
+        ''' Returns the {field: hash} and the {field: value} of the tracked fields last recorded for the key'''
+        with self._lock:
+            row = self._conn.execute("SELECT field_hashes, tracked FROM products WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return {}, {}
+        return json.loads(row[0] or '{}'), json.loads(row[1] or '{}')
+
+    def record(self, retailer, url, row, columns=(), tracked=(), scraped_at=None, content_hash=None):
+        ''' Records the scrape of the url with the hash of its extracted row, the hash of each of the `columns`
+            and the values of the `tracked` ones'''
+        values = dict(zip(columns, row))
+        entry = (product_key(url), retailer, url, scraped_at or time.time(), content_hash or row_hash(row),
+                 json.dumps({column: field_hash(value) for column, value in values.items()}),
+                 json.dumps({column: values[column] for column in tracked}, ensure_ascii=False, default=str))
+        with self._lock:
+            self._pending.append(entry)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def touch(self, key, scraped_at=None):
+        ''' Records a new scrape of an unchanged product'''
+        with self._lock:
+            self._touched.append((scraped_at or time.time(), key))
+            if len(self._touched) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending and not self._touched:
+            return
+        self._conn.execute("BEGIN")
+        self._conn.executemany("INSERT INTO products (key, retailer, url, scraped_at, content_hash, field_hashes, "
+                               "tracked) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                               "retailer = excluded.retailer, url = excluded.url, scraped_at = excluded.scraped_at, "
+                               "content_hash = excluded.content_hash, field_hashes = excluded.field_hashes, "
+                               "tracked = excluded.tracked", self._pending)
+        self._conn.executemany("UPDATE products SET scraped_at = ? WHERE key = ?", self._touched)
+        self._conn.execute("COMMIT")
+        self._pending = []
+        self._touched = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+
+def unique_products(urls, index=None, max_age=None, stats=None, shard=None):
+    ''' Yields the urls of the products not seen before in the stream, the first url of every product key.
+        With an index and `max_age` (seconds), the products scraped less than `max_age` seconds ago are skipped too.
+        With `shard` = (i, N) only the products of the ith of N shards are kept, see urls.shard_of.
+        `stats` counts the "duplicate", "recent" and "other_shard" urls dropped'''
+    seen = set()
+    since = time.time() - max_age if max_age is not None else None
+    stats = {} if stats is None else stats
+    for url in urls:
+        key = product_key(url)
+        if shard is not None and shard_of(key, shard[1]) != shard[0]:
+            stats['other_shard'] = stats.get('other_shard', 0) + 1
+            continue
+        if key in seen:
+            stats['duplicate'] = stats.get('duplicate', 0) + 1
+            continue
+        seen.add(key)
+        if index is not None and since is not None and index.scraped_since(key, since):
+            stats['recent'] = stats.get('recent', 0) + 1
+            continue
+        yield url
@@ -0,0 +1,81 @@
+##########################################################################################################################
+#  Purpose of this Script: Check of the worker mode. A sqlite job queue is filled with the product urls of the mock
+#                              retailers of mock_retailer.py and drained by several "all_retailer.py --worker"
+#                              processes at once, each one with output and state files of its own.
+#                          The queue must end with every job done, every row written once and every worker exited.
+#                              Prints the drain time and exits 1 otherwise, e.g. when the workers wait on each other.
+
+#  Execution Instruction: python queue_benchmark.py [--workers 2] [--urls 30] [--timeout 120]
+##########################################################################################################################
+
+
+# importing required libraries
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark import CURRENT_DIR
+from job_queue import DONE, SqliteQueue
+from mock_retailer import MockRetailerServer
+
+
+def drain(workers, urls, timeout):
+    ''' Runs the workers on a queue of `urls` jobs per retailer, returns (seconds, queue counts, rows, exit codes)'''
+    with MockRetailerServer(latency=0.01, jitter=0.01, page_kb=50) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        queue_path = os.path.join(directory, 'jobs.sqlite')
+        queue = SqliteQueue(queue_path)
+        queue.put((retailer, url) for retailer in server.urls for url in server.product_urls(retailer, urls))
+        started = time.perf_counter()
+        processes = []
+        for worker in range(workers):
+            worker_dir = os.path.join(directory, str(worker))
+            os.makedirs(worker_dir)
+            processes.append(subprocess.Popen(
+                [sys.executable, 'all_retailer.py', '--queue', queue_path, '--worker', '--fetch-mode', 'http',
+                 '--rate', '100', '--host-concurrency', '8', '--concurrency', '8', '--parse-workers', '1',
+                 '--output-dir', worker_dir, '--state-dir', worker_dir, '--format', 'jsonl'],
+                cwd=CURRENT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        codes = []
+        for process in processes:
+            try:
+                codes.append(process.wait(timeout=max(1.0, timeout - (time.perf_counter() - started))))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+                codes.append(None)
+        seconds = time.perf_counter() - started
+        counts = queue.counts()
+        queue.close()
+        rows = 0
+        for path in glob.glob(os.path.join(directory, '*', '*_output_*.jsonl')):
+            with open(path, encoding='utf-8') as output_file:
+                rows += sum(1 for _ in output_file)
+    return seconds, counts, rows, codes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drains a job queue with several workers")
+    parser.add_argument('--workers', type=int, default=2, help="worker processes")
+    parser.add_argument('--urls', type=int, default=30, help="product urls per mock retailer")
+    parser.add_argument('--timeout', type=float, default=120.0, help="seconds before the workers are killed")
+    args = parser.parse_args()
+
+    seconds, counts, rows, codes = drain(args.workers, args.urls, args.timeout)
+    jobs = 2 * args.urls
+    print("%d workers, %d jobs in %.1f s, queue %s, %d rows, exit codes %s" % (args.workers, jobs, seconds, counts,
+                                                                               rows, codes))
+    drained = counts.get(DONE) == jobs and sum(counts.values()) == jobs and rows == jobs
+    if not drained or any(code != 0 for code in codes):
+        print("queue not drained")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
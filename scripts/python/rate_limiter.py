@@ -0,0 +1,199 @@
+##########################################################################################################################
+#  Purpose of this Script: Politeness of the fetch scheduler. Every host gets a token bucket for its request rate and an
+#                              AIMD concurrency limit: each good response raises the limit and the rate a little, a
+#                              429/503 or a captcha page halves them and pauses the host for a jittered backoff.
+#                          The limiter works on the time given by the caller, the scheduler passes the event loop time,
+#                              so runs on a SimulatedLoop replay hours of throttling in milliseconds.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import asyncio
+import logging
+import random
+import selectors
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger()
+
+# statuses the retailers answer with when we go too fast
+THROTTLE_STATUSES = (429, 503)
+# texts of the captcha / robot check pages served with a 200
+CAPTCHA_MARKERS = (
+    '/errors/validateCaptcha',
+    'Type the characters you see in this image',
+    'px-captcha',
+    'Robot or human?',
+)
+
+
+class ThrottledError(RuntimeError):
+    ''' Raised for a url still throttled after the last retry'''
+
+
+def is_throttled(page):
+    ''' Tells whether the page is a rate limit answer or a captcha instead of the product page'''
+    if page.status in THROTTLE_STATUSES:
+        return True
+    html = page.html or ''
+    # the captcha pages are small, this skips the search in the full product pages
+    return len(html) < 200000 and any(marker in html for marker in CAPTCHA_MARKERS)
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+class TokenBucket:
+    ''' `rate` requests per second with bursts of up to `burst` requests'''
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = None
+
+    def _refill(self, now):
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now):
+        ''' Time at which the next token is available'''
+        self._refill(now)
+        return now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class HostState:
+    ''' Rate, concurrency limit and backoff of one host'''
+
+    def __init__(self, rate, burst, concurrency):
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = float(concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.throttles = 0
+
+
+class RateLimiter:
+    ''' Per-host token buckets with AIMD concurrency.
+        `rate` and `concurrency` are the ceilings per host, `rates` overrides the rate of some hosts.
+        After a throttled response the host waits a backoff of `backoff` * 2^(throttles in a row) seconds, capped at
+        `max_backoff`, of which a random half is jitter so the workers do not come back all at once'''
+
+    def __init__(self, rate=1.0, burst=2, concurrency=4, rates=None, min_rate=0.05, recovery=0.05, decrease=0.5,
+                 backoff=2.0, max_backoff=120.0, seed=None):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.rates = rates or {}
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.decrease = decrease
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.random = random.Random(seed)
+        self.hosts = {}
+
+    def host(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.max_rate(host), self.burst, self.concurrency)
+        return self.hosts[host]
+
+    def max_rate(self, host):
+        for pattern, rate in self.rates.items():
+            if host == pattern or host.endswith('.' + pattern):
+                return rate
+        return self.rate
+
+    def ready_at(self, host, now):
+        ''' Time at which the host can take one more request, None while its concurrency limit is reached'''
+        state = self.host(host)
+        if state.in_flight >= int(state.limit):
+            return None
+        return max(state.paused_until, state.bucket.ready_at(now))
+
+    def acquire(self, host, now):
+        state = self.host(host)
+        state.bucket.take(now)
+        state.in_flight += 1
+
+    def release(self, host, now, throttled=False, network=True):
+        ''' Ends a request: additive increase after a good response, multiplicative decrease and a pause after a
+            throttled one. Requests which did not reach the host (`network=False`, cache hits) give their token back'''
+        state = self.host(host)
+        state.in_flight -= 1
+        if not network:
+            state.bucket.refund()
+            return 0.0
+        if not throttled:
+            state.throttles = 0
+            state.limit = min(self.concurrency, state.limit + 1 / state.limit)
+            state.bucket.rate = min(self.max_rate(host), state.bucket.rate + self.recovery * self.max_rate(host))
+            return 0.0
+        state.throttles += 1
+        state.limit = max(1.0, state.limit * self.decrease)
+        state.bucket.rate = max(self.min_rate, state.bucket.rate * self.decrease)
+        ceiling = min(self.max_backoff, self.backoff * 2 ** (state.throttles - 1))
+        delay = ceiling / 2 + self.random.random() * ceiling / 2
+        state.paused_until = max(state.paused_until, now + delay)
+        logger.info("%s throttled, pausing %.1fs, rate %.2f/s, concurrency %d", host, delay, state.bucket.rate,
+                    int(state.limit))
+        return delay
+
+    def summary(self):
+        return ", ".join("%s: %.2f/s x%d" % (host, state.bucket.rate, int(state.limit))
+                         for host, state in sorted(self.hosts.items()))
+
+
+class _SimulatedSelector(selectors.DefaultSelector):
+
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+
+    def select(self, timeout=None):
+        # instead of sleeping until the next timer the clock jumps to it, unless fetches are running in the
+        # executor: the loop then really waits for them and the clock follows the real time
+        if timeout is not None and timeout > 0 and not self.loop.running_in_executor:
+            self.loop.advance(timeout)
+            timeout = 0
+        return super().select(timeout)
+
+
+class SimulatedLoop(asyncio.SelectorEventLoop):
+    ''' Event loop on a simulated clock starting at `start`: while nothing runs in the executor asyncio.sleep() and
+        the timeouts return at once and move the clock forward, otherwise the clock goes at the real pace. Pass
+        `SimulatedLoop` as the loop_factory of the FetchScheduler to test it, and its time() as the clock of the
+        MockRetailerServer so the server counts its rate limits on the same clock (see simulated_benchmark.py)'''
+
+    def __init__(self, start=0.0):
+        selector = _SimulatedSelector()
+        super().__init__(selector)
+        selector.loop = self
+        self._offset = start - time.monotonic()
+        self.running_in_executor = 0
+
+    def time(self):
+        return time.monotonic() + self._offset
+
+    def advance(self, seconds):
+        self._offset += seconds
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.running_in_executor += 1
+        future.add_done_callback(self._executor_done)
+        return future
+
+    def _executor_done(self, future):
+        self.running_in_executor -= 1
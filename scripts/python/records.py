@@ -0,0 +1,185 @@
+##########################################################################################################################
+#  Purpose of this Script: Typed output records. The extractors return the texts of the pages ("$13.99",
+#                              "4.2 out of 5 stars", "Out of Stock."), every retailer has a record type here with
+#                              numeric prices and rating, an Availability value and the currency of the prices. The
+#                              amazon reviews of reviews.py have one too, with their dates and vote counts.
+#                          The record types are the schema of the output: their fields give the columns and their
+#                              types (the parquet column types), their class variables which columns are parsed how.
+#                              The rows themselves stay lists, normalized by batch, one pandas pass per column over
+#                              every chunk of rows written by the sinks, instead of string handling row by row.
+#                              pandas is only imported by the first batch.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import dataclasses
+import enum
+import typing
+from dataclasses import dataclass
+from typing import ClassVar, Optional, Tuple
+
+
+class Availability(str, enum.Enum):
+    IN_STOCK = 'in_stock'
+    OUT_OF_STOCK = 'out_of_stock'
+    UNKNOWN = 'unknown'
+
+
+# first amount of a price text, with the currency symbol or code written before it. The walmart price node holds
+# the price twice ("$5.57$5.57"), only the first one is taken
+PRICE_PATTERN = r'(?P<currency>[$£€₹¥]|[A-Z]{3})?\s*(?P<amount>\d[\d,]*(?:\.\d+)?)'
+RATING_PATTERN = r'(\d+(?:\.\d+)?)'
+# "One person found this helpful", "1,024 people found this helpful"
+COUNT_PATTERN = r'(\d[\d,]*)'
+# "Reviewed in the United States on June 5, 2020"
+DATE_PATTERN = r'(?:\bon\s+)?([A-Z][a-z]+ \d{1,2}, \d{4})'
+DATE_FORMAT = '%B %d, %Y'
+CURRENCY_SYMBOLS = {'$': 'USD', '£': 'GBP', '€': 'EUR', '₹': 'INR', '¥': 'JPY'}
+
+# lower case availability texts, checked in order: "only 2 left in stock" is in stock, "not in stock" is not
+OUT_OF_STOCK_PATTERN = r'out of stock|unavailable|not available|not in stock|sold out'
+IN_STOCK_PATTERN = r'in stock|available from|add to cart'
+
+
+@dataclass
+class WalmartRecord:
+    ''' A walmart.com product'''
+    Title: str
+    Categories: str
+    Price: Optional[float]
+    Currency: Optional[str]
+    Ratings: Optional[float]
+    Availability: Availability
+    Features: str
+    Description: str
+
+    PRICES: ClassVar[Tuple[str, ...]] = ('Price',)
+    RATINGS: ClassVar[Tuple[str, ...]] = ('Ratings',)
+    AVAILABILITY: ClassVar[str] = 'Availability'
+    CURRENCY: ClassVar[str] = 'Currency'
+    DEFAULT_CURRENCY: ClassVar[str] = 'USD'
+
+
+@dataclass
+class AmazonRecord:
+    ''' An amazon.com product'''
+    Title: str
+    categories: str
+    List_price: Optional[float]
+    price: Optional[float]
+    currency: Optional[str]
+    rating: Optional[float]
+    Availability: Availability
+    Features: str
+    product_description: str
+    product_details: str
+    Top_Reviews: str
+
+    PRICES: ClassVar[Tuple[str, ...]] = ('List_price', 'price')
+    RATINGS: ClassVar[Tuple[str, ...]] = ('rating',)
+    AVAILABILITY: ClassVar[str] = 'Availability'
+    CURRENCY: ClassVar[str] = 'currency'
+    DEFAULT_CURRENCY: ClassVar[str] = 'USD'
+
+
+@dataclass
+class ReviewRecord:
+    ''' An amazon.com customer review, `date` as YYYY-MM-DD'''
+    review_id: str
+    product_key: str
+    rating: Optional[float]
+    title: str
+    author: str
+    date: Optional[str]
+    verified_purchase: bool
+    helpful_votes: Optional[int]
+    body: str
+    url: str
+
+    RATINGS: ClassVar[Tuple[str, ...]] = ('rating',)
+    COUNTS: ClassVar[Tuple[str, ...]] = ('helpful_votes',)
+    DATES: ClassVar[Tuple[str, ...]] = ('date',)
+
+
+def record_columns(record_type):
+    return [record_field.name for record_field in dataclasses.fields(record_type)]
+
+
+def column_types(record_type):
+    ''' {column: float, str or Availability} of the record type, Optional[x] counting as x'''
+    hints = typing.get_type_hints(record_type)
+    types = {}
+    for name in record_columns(record_type):
+        hint = hints[name]
+        args = [arg for arg in typing.get_args(hint) if arg is not type(None)]
+        types[name] = args[0] if args else hint
+    return types
+
+
+def parse_prices(texts):
+    ''' (amounts, currency codes) of a Series of price texts, NaN / None when there is no amount'''
+    import pandas as pd
+    parts = texts.astype('string').str.extract(PRICE_PATTERN)
+    amounts = pd.to_numeric(parts['amount'].str.replace(',', '', regex=False), errors='coerce').astype('float64')
+    currencies = parts['currency'].map(lambda symbol: CURRENCY_SYMBOLS.get(symbol, symbol), na_action='ignore')
+    return amounts, currencies
+
+
+def parse_ratings(texts):
+    import pandas as pd
+    return pd.to_numeric(texts.astype('string').str.extract(RATING_PATTERN)[0], errors='coerce').astype('float64')
+
+
+def parse_counts(texts):
+    import pandas as pd
+    texts = texts.astype('string').str.replace(r'^\s*one\b', '1', case=False, regex=True)
+    counts = texts.str.extract(COUNT_PATTERN)[0].str.replace(',', '', regex=False)
+    return pd.to_numeric(counts, errors='coerce').astype('Int64')
+
+
+def parse_dates(texts):
+    import pandas as pd
+    dates = pd.to_datetime(texts.astype('string').str.extract(DATE_PATTERN)[0], format=DATE_FORMAT, errors='coerce')
+    return dates.dt.strftime('%Y-%m-%d')
+
+
+def parse_availability(texts):
+    import numpy as np
+    import pandas as pd
+    lowered = texts.astype('string').str.lower().fillna('')
+    return pd.Series(np.select([lowered.str.contains(OUT_OF_STOCK_PATTERN), lowered.str.contains(IN_STOCK_PATTERN)],
+                               [Availability.OUT_OF_STOCK.value, Availability.IN_STOCK.value],
+                               Availability.UNKNOWN.value), index=texts.index)
+
+
+def normalize(frame, record_type):
+    ''' Returns the frame of extracted texts (columns of the spec) in the columns of the record type, with the prices
+        and ratings as floats, the counts as integers, the dates in ISO format, the availability values and the
+        currency of the first price found. The record type lists the columns of each kind in its class variables'''
+    import pandas as pd
+    frame = frame.copy()
+    prices = list(getattr(record_type, 'PRICES', ()))
+    if prices:
+        currency = pd.Series(None, index=frame.index, dtype=object)
+        for column in prices:
+            frame[column], currencies = parse_prices(frame[column])
+            currency = currency.fillna(currencies.where(frame[column].notna()).astype(object))
+        frame[record_type.CURRENCY] = currency.where(currency.notna() | frame[prices].isna().all(axis=1),
+                                                     record_type.DEFAULT_CURRENCY)
+    for column in getattr(record_type, 'RATINGS', ()):
+        frame[column] = parse_ratings(frame[column])
+    for column in getattr(record_type, 'COUNTS', ()):
+        frame[column] = parse_counts(frame[column])
+    for column in getattr(record_type, 'DATES', ()):
+        frame[column] = parse_dates(frame[column])
+    if getattr(record_type, 'AVAILABILITY', None):
+        frame[record_type.AVAILABILITY] = parse_availability(frame[record_type.AVAILABILITY])
+    return frame[record_columns(record_type)]
+
+
+def normalize_rows(rows, columns, record_type):
+    ''' Rows of extracted texts -> typed rows in the columns of the record type, None for the missing numbers'''
+    import pandas as pd
+    frame = normalize(pd.DataFrame(rows, columns=columns), record_type)
+    return frame.astype(object).where(frame.notna(), None).values.tolist()
@@ -0,0 +1,79 @@
+##########################################################################################################################
+#  Purpose of this Script: Registry of the supported retailers. Every retailer module registers the RetailerSpec of
+#                              its retailer (extractor fields, record type of the output rows and the host names of
+#                              its pages), specs.py registers walmart and amazon.
+#                          route() gives the retailer of a url by its host, so one input file of mixed urls is split
+#                              per retailer as it is read, and all the retailers are scraped by the same scheduler and
+#                              parser pool into one output file each.
+#                          A retailer of another module is added with load_modules(['my_retailer']), the module calls
+#                              register(MY_SPEC) at import. The parser processes load the same modules.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import importlib
+from urllib.parse import urlsplit
+
+# retailer name: RetailerSpec, in registration order
+SPECS = {}
+
+# modules loaded by load_modules(), loaded again by the parser processes
+MODULES = []
+
+# host: retailer name of the hosts already routed
+_routes = {}
+
+
+def register(spec):
+    ''' Adds the retailer of the spec and returns the spec. A name is registered once'''
+    if spec.name in SPECS and SPECS[spec.name] is not spec:
+        raise ValueError("retailer %r is already registered" % spec.name)
+    for host in spec.hosts:
+        for other in SPECS.values():
+            if other is not spec and host in other.hosts:
+                raise ValueError("host %r of %r is already registered by %r" % (host, spec.name, other.name))
+    SPECS[spec.name] = spec
+    _routes.clear()
+    return spec
+
+
+def load_modules(names):
+    ''' Imports the retailer modules, which register their specs'''
+    for name in names:
+        importlib.import_module(name)
+        if name not in MODULES:
+            MODULES.append(name)
+
+
+def host_of(url):
+    ''' Lower case host of the url without port and credentials'''
+    return (urlsplit(url).hostname or '').rstrip('.')
+
+
+def route(url):
+    ''' Name of the retailer whose hosts match the url, "www.amazon.com" and "smile.amazon.com" matching "amazon.com".
+        None when no retailer does'''
+    host = host_of(url)
+    if host not in _routes:
+        name = None
+        for spec in SPECS.values():
+            if any(host == pattern or host.endswith('.' + pattern) for pattern in spec.hosts):
+                name = spec.name
+                break
+        _routes[host] = name
+    return _routes[host]
+
+
+def route_jobs(urls, retailers=None, stats=None):
+    ''' Yields the (retailer, url) jobs of a stream of mixed urls, for the `retailers` only when given.
+        `stats` counts the "unknown_host" and "other_retailer" urls dropped'''
+    stats = {} if stats is None else stats
+    for url in urls:
+        name = route(url)
+        if name is None:
+            stats['unknown_host'] = stats.get('unknown_host', 0) + 1
+        elif retailers is not None and name not in retailers:
+            stats['other_retailer'] = stats.get('other_retailer', 0) + 1
+        else:
+            yield name, url
@@ -0,0 +1,183 @@
+##########################################################################################################################
+#  Purpose of this Script: Customer reviews of the amazon products. The product page only shows a few reviews, so the
+#                              review pages of every ASIN are walked, most recent first, up to `max_pages` pages, and
+#                              every review is written as a row of its own (ReviewRecord of records.py) to a sink
+#                              keyed by product.
+#                          The ASINs are taken in chunks, the page n of every ASIN of a chunk still to walk goes
+#                              through the FetchScheduler together, so the products are walked concurrently under the
+#                              rate limits and the memory is bounded by the chunk.
+#                          The review ids on disk are kept in a ReviewIndex, fed by the sink as it flushes, and are
+#                              never written twice. With `incremental` the walk of a product stops at the first page
+#                              holding a known review, as the older ones were fetched by an earlier run.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import logging
+import sqlite3
+import threading
+import time
+from itertools import islice
+
+from failures import PARSE, Failure
+from parsers import get_backend
+from urls import product_key
+
+logger = logging.getLogger()
+
+REVIEWS_URL = 'https://www.amazon.com/product-reviews/%s/?sortBy=recent&pageNumber=%d'
+
+# the extracted texts of a review in the order of REVIEW_COLUMNS, normalized by the ReviewRecord
+REVIEW_COLUMNS = ['review_id', 'product_key', 'rating', 'title', 'author', 'date', 'verified_purchase',
+                  'helpful_votes', 'body', 'url']
+
+# fields of REVIEW_COLUMNS written to the text store of the output when there is one
+REVIEW_TEXT_FIELDS = ('body',)
+
+REVIEW_SELECTOR = 'div[data-hook="review"]'
+NEXT_PAGE_SELECTOR = 'ul.a-pagination li.a-last a'
+FIELD_SELECTORS = {
+    'rating': '[data-hook="review-star-rating"], [data-hook="cmps-review-star-rating"]',
+    # the title link also holds the hidden text of the stars
+    'title': '[data-hook="review-title"] span:not(.a-icon-alt)',
+    'author': 'span.a-profile-name',
+    'date': 'span[data-hook="review-date"]',
+    'verified_purchase': 'span[data-hook="avp-badge"]',
+    'helpful_votes': 'span[data-hook="helpful-vote-statement"]',
+    'body': 'span[data-hook="review-body"]',
+}
+
+
+def reviews_url(asin, page):
+    return REVIEWS_URL % (asin, page)
+
+
+def asins_of(urls):
+    ''' Yields the ASIN of the amazon product urls, once per product'''
+    seen = set()
+    for url in urls:
+        key = product_key(url)
+        if key.startswith('amazon:') and key not in seen:
+            seen.add(key)
+            yield key[len('amazon:'):]
+
+
+class ReviewExtractor:
+    ''' Review rows of a review page, with the selectors compiled once for the parser backend'''
+
+    def __init__(self, backend='lxml'):
+        # the strained parser needs the subtrees of a product spec
+        self.backend = get_backend('bs4' if backend == 'bs4-strained' else backend)
+        self.review = self.backend.compile(REVIEW_SELECTOR)
+        self.next_page = self.backend.compile(NEXT_PAGE_SELECTOR)
+        self.fields = {name: self.backend.compile(selector) for name, selector in FIELD_SELECTORS.items()}
+
+    def extract(self, html, asin, url):
+        ''' Returns the rows of the reviews of the page and whether there is a next page'''
+        doc = self.backend.parse(html, None)
+        rows = []
+        for node in self.backend.select(self.review, doc):
+            review_id = self.backend.attribute(node, 'id')
+            if not review_id:
+                continue
+            values = {}
+            for name, pattern in self.fields.items():
+                texts = [self.backend.text(match).strip() for match in self.backend.select(pattern, node)]
+                texts = [text for text in texts if text]
+                values[name] = texts[-1] if name == 'title' and texts else (texts[0] if texts else "")
+            values['verified_purchase'] = bool(values['verified_purchase'])
+            rows.append([review_id, 'amazon:' + asin, values['rating'], values['title'], values['author'],
+                         values['date'], values['verified_purchase'], values['helpful_votes'], values['body'], url])
+        return rows, bool(self.backend.select(self.next_page, doc))
+
+
+class ReviewIndex:
+    ''' review id -> product key of the reviews written, in a sqlite database at `path`'''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS reviews (
+                                  review_id TEXT PRIMARY KEY,
+                                  product_key TEXT NOT NULL,
+                                  scraped_at REAL NOT NULL)""")
+
+    def known(self, review_ids):
+        ''' The review ids already recorded among `review_ids`'''
+        review_ids = list(review_ids)
+        known = set()
+        with self._lock:
+            # 500 ids per query, below the sqlite limit of host parameters
+            for start in range(0, len(review_ids), 500):
+                chunk = review_ids[start:start + 500]
+                known.update(row[0] for row in self._conn.execute(
+                    "SELECT review_id FROM reviews WHERE review_id IN (%s)" % ", ".join("?" * len(chunk)), chunk))
+        return known
+
+    def record(self, keys):
+        ''' Records the (product key, review id) of the reviews written, the sink keys of the review rows'''
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR IGNORE INTO reviews (review_id, product_key, scraped_at) "
+                                   "VALUES (?, ?, ?)", [(review_id, key, now) for key, review_id in keys])
+            self._conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def scrape_reviews(asins, scheduler, sink, index, max_pages=10, incremental=False, chunk_size=500,
+                   backend='lxml'):
+    ''' Walks the review pages of the ASINs and writes the new reviews to the sink, keyed by (product key, review id)
+        for the `on_flush` of the sink to record them in the index. The ASINs are read `chunk_size` at a time.
+        Returns the counts of pages, reviews written, duplicates dropped and failed pages'''
+    extractor = ReviewExtractor(backend)
+    stats = {'products': 0, 'pages': 0, 'reviews': 0, 'duplicates': 0, 'failed': 0}
+    asins = iter(asins)
+    while True:
+        chunk = list(islice(asins, chunk_size))
+        if not chunk:
+            break
+        stats['products'] += len(chunk)
+        # ASIN -> next review page, for the products still walked. `seen` holds the reviews of the chunk not yet
+        # flushed, a new review moves the others one place down the pages while they are walked
+        walking = {asin: 1 for asin in chunk}
+        seen = set()
+        while walking:
+            urls = {reviews_url(asin, page): asin for asin, page in walking.items()}
+            walked = {}
+
+            def on_page(retailer, page):
+                asin = urls[page.url]
+                stats['pages'] += 1
+                try:
+                    rows, has_next = extractor.extract(page.html, asin, page.url)
+                except Exception as error:
+                    # a page the extractor can not read ends the walk of its product only
+                    on_error(retailer, page.url, Failure.from_error(error, default=PARSE))
+                    walked[asin] = False
+                    return
+                known = index.known(row[0] for row in rows)
+                new = [row for row in rows if row[0] not in known and row[0] not in seen]
+                stats['duplicates'] += len(rows) - len(new)
+                for row in new:
+                    seen.add(row[0])
+                    sink.write(row, key=(row[1], row[0]))
+                stats['reviews'] += len(new)
+                walked[asin] = has_next and bool(rows) and not (incremental and known)
+
+            def on_error(retailer, url, failure):
+                stats['failed'] += 1
+                logger.info("%s REVIEWS NOT PROCESSED - %s", url, failure.kind.upper(),
+                            extra={'retailer': retailer, 'kind': failure.kind, 'error': failure.message})
+
+            scheduler.run((('amazon', url) for url in urls), on_page, on_error)
+            walking = {asin: walking[asin] + 1 for asin, more in walked.items()
+                       if more and walking[asin] < max_pages}
+        logger.info("Reviews %s", stats)
+    return stats
@@ -0,0 +1,149 @@
+##########################################################################################################################
+#  Purpose of this Script: Selector health of the scraping runs. When a retailer changes its markup the extractors
+#                              keep writing "Not available" rows, so the hit rate of every field is tracked over the
+#                              last `window` parsed pages of each retailer.
+#                          Once `min_pages` pages are in the window, a field found on fewer than `threshold` of them
+#                              (the `min_hit_rate` of its FieldSpec when set) is taken as broken: the action "pause"
+#                              stops fetching the pages of that retailer, "abort" stops the whole crawl and "warn"
+#                              only logs it. The urls not fetched stay pending for the run after the fix.
+#                          The last `samples` pages of every retailer missing a field are kept in memory and saved
+#                              under `sample_dir` at the first broken field, with a samples.jsonl of their urls and
+#                              missing fields, to debug the selectors offline (see parser_benchmark.py).
+##########################################################################################################################
+
+
+# importing required libraries
+
+import json
+import logging
+import os
+import re
+from collections import deque
+
+logger = logging.getLogger()
+
+ACTIONS = ('pause', 'abort', 'warn')
+
+
+class ExtractionDriftError(RuntimeError):
+    ''' Raised at the end of a crawl aborted by the selector health checks'''
+
+
+class FieldWindow:
+    ''' Hits and misses of one field over the last `size` pages'''
+
+    __slots__ = ('results', 'hits')
+
+    def __init__(self, size):
+        self.results = deque(maxlen=size)
+        self.hits = 0
+
+    def add(self, hit):
+        if len(self.results) == self.results.maxlen:
+            self.hits -= self.results[0]
+        self.results.append(hit)
+        self.hits += hit
+
+    def __len__(self):
+        return len(self.results)
+
+    @property
+    def rate(self):
+        return self.hits / len(self.results) if self.results else None
+
+
+class SelectorHealth:
+    ''' Rolling hit rate of the fields of the `specs` ({retailer: RetailerSpec}), fed with every parsed page by the
+        Pipeline. halted(retailer) tells the scheduler which retailers not to fetch any more'''
+
+    def __init__(self, specs, window=200, min_pages=50, threshold=0.2, action='pause', sample_dir=None, samples=5):
+        if action not in ACTIONS:
+            raise ValueError("Unknown selector health action %r, expected one of %s" % (action, "/".join(ACTIONS)))
+        self.specs = specs
+        self.window = window
+        self.min_pages = min(min_pages, window)
+        self.threshold = threshold
+        self.action = action
+        self.sample_dir = sample_dir
+        self.samples = samples
+        self.windows = {}       # retailer -> {field: FieldWindow}
+        self.failing = {}       # retailer -> deque of (url, missing fields, html)
+        self.broken = {}        # retailer -> {field: hit rate when it broke}
+        self.paused = set()
+        self.aborted = False
+
+    def min_hit_rate(self, retailer, field):
+        for field_spec in self.specs[retailer].fields:
+            if field_spec.name == field:
+                return self.threshold if field_spec.min_hit_rate is None else field_spec.min_hit_rate
+        return self.threshold
+
+    def halted(self, retailer):
+        return self.aborted or retailer in self.paused
+
+    def observe(self, retailer, url, missing, html=None, complete=True):
+        ''' Records the fields found on one parsed page, every field of the spec but the `missing` ones. With
+            `complete` False the extraction stopped at a missing required field and only the missing ones are
+            recorded. Returns the fields which broke with this page'''
+        windows = self.windows.setdefault(retailer, {})
+        observed = self.specs[retailer].columns if complete else missing
+        for field in observed:
+            if field not in windows:
+                windows[field] = FieldWindow(self.window)
+            windows[field].add(field not in missing)
+        if missing and self.samples:
+            self.failing.setdefault(retailer, deque(maxlen=self.samples)).append((url, list(missing), html))
+
+        broken = self.broken.setdefault(retailer, {})
+        newly_broken = {}
+        for field in observed:
+            field_window = windows[field]
+            if field in broken or len(field_window) < self.min_pages:
+                continue
+            if field_window.rate < self.min_hit_rate(retailer, field):
+                newly_broken[field] = field_window.rate
+        if newly_broken:
+            self._broke(retailer, newly_broken, first=not broken)
+            broken.update(newly_broken)
+        return list(newly_broken)
+
+    def _broke(self, retailer, fields, first):
+        logger.error("%s selectors broken, hit rate over the last %d pages: %s", retailer, self.window,
+                     ", ".join("%s %.0f%%" % (field, 100 * rate) for field, rate in fields.items()),
+                     extra={'retailer': retailer, 'fields': sorted(fields)})
+        if first and self.sample_dir is not None and self.failing.get(retailer):
+            logger.error("%s failing pages saved in %s", retailer, self.save_samples(retailer))
+        if self.action == 'pause' and retailer not in self.paused:
+            self.paused.add(retailer)
+            logger.error("%s paused, its urls left are not fetched", retailer)
+        elif self.action == 'abort' and not self.aborted:
+            self.aborted = True
+            logger.error("Crawl aborted by the broken selectors of %s", retailer)
+
+    def save_samples(self, retailer):
+        ''' Writes the failing pages kept for the retailer, returns their directory'''
+        directory = os.path.join(self.sample_dir, retailer)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'samples.jsonl'), 'a', encoding='utf-8') as index_file:
+            for url, missing, html in self.failing.pop(retailer):
+                if html is None:
+                    continue
+                name = re.sub(r'[^A-Za-z0-9]+', '_', url.split('://')[-1])[:100] + '.html'
+                with open(os.path.join(directory, name), 'w', encoding='utf-8') as page_file:
+                    page_file.write(html)
+                index_file.write(json.dumps({'url': url, 'missing': missing, 'file': name}) + "\n")
+        return directory
+
+    def rates(self, retailer):
+        ''' {field: hit rate over the window} of the retailer'''
+        return {field: window.rate for field, window in self.windows.get(retailer, {}).items()}
+
+    def summary(self):
+        return {retailer: {field: round(rate, 3) for field, rate in self.rates(retailer).items()}
+                for retailer in self.windows}
+
+    def check(self):
+        ''' Raises ExtractionDriftError when the crawl was aborted'''
+        if self.aborted:
+            raise ExtractionDriftError("crawl aborted, broken selectors %s" % {
+                retailer: sorted(fields) for retailer, fields in self.broken.items() if fields})
@@ -0,0 +1,70 @@
+##########################################################################################################################
+#  Purpose of this Script: Check of the polite FetchScheduler on the simulated clock of rate_limiter.py. The product
+#                              urls of the mock retailers of mock_retailer.py are fetched over http by a scheduler
+#                              running on a SimulatedLoop, the server answering with 429 above `max_rate` requests
+#                              per second per retailer, counted on the same simulated clock.
+#                          The limiter starts above the server limit, so it has to back off. Every url must end with
+#                              its page and none given up. Prints the simulated and real seconds and the 429 answers,
+#                              and exits 1 otherwise. "--loop real" runs the same check on the real clock.
+
+#  Execution Instruction: python simulated_benchmark.py [--urls 30] [--max-rate 5] [--rate 10] [--loop simulated]
+##########################################################################################################################
+
+
+# importing required libraries
+
+import argparse
+import asyncio
+import sys
+import time
+
+from fetcher import FetchScheduler, HttpFetcher
+from mock_retailer import MockRetailerServer
+from rate_limiter import RateLimiter, SimulatedLoop
+
+
+def crawl(urls, max_rate, rate, simulated):
+    ''' Fetches `urls` product urls of every mock retailer, returns (clock seconds, real seconds, pages, failures,
+        429 answers)'''
+    loop = SimulatedLoop() if simulated else asyncio.new_event_loop()
+    pages, failures = [], []
+    with MockRetailerServer(latency=0.01, jitter=0.01, max_rate=max_rate, page_kb=20, clock=loop.time) as server:
+        jobs = [(retailer, url) for retailer in server.urls for url in server.product_urls(retailer, urls)]
+        fetcher = HttpFetcher(timeout=10, pool_size=8)
+        limiter = RateLimiter(rate=rate, concurrency=4, seed=0)
+        scheduler = FetchScheduler(fetcher, concurrency=8, limiter=limiter, loop_factory=lambda: loop, seed=0)
+        started, clock_started = time.perf_counter(), loop.time()
+        try:
+            scheduler.run(jobs, lambda retailer, page: pages.append(page.url),
+                          lambda retailer, url, failure: failures.append((url, failure)))
+        finally:
+            fetcher.close()
+        throttled = sum(count for (retailer, status), count in server.stats.items() if status == 429)
+    # the runner closes the loop, its clock stays readable
+    return loop.time() - clock_started, time.perf_counter() - started, pages, failures, throttled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetches the mock retailers under their rate limits on a "
+                                                 "simulated clock")
+    parser.add_argument('--urls', type=int, default=30, help="product urls per mock retailer")
+    parser.add_argument('--max-rate', type=float, default=5, help="requests/sec per retailer before a 429")
+    parser.add_argument('--rate', type=float, default=10, help="requests/sec per host the limiter starts at")
+    parser.add_argument('--loop', default='simulated', choices=['simulated', 'real'], help="clock of the scheduler")
+    args = parser.parse_args()
+
+    seconds, real_seconds, pages, failures, throttled = crawl(args.urls, args.max_rate, args.rate,
+                                                              args.loop == 'simulated')
+    jobs = 2 * args.urls
+    print("%s loop: %d/%d pages in %.1f s on the clock, %.1f s real, %d answers 429, %d urls given up" % (
+        args.loop, len(pages), jobs, seconds, real_seconds, throttled, len(failures)))
+    for url, failure in failures[:10]:
+        print("  %s - %s" % (url, failure))
+    if failures or len(pages) != jobs:
+        print("urls not fetched")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
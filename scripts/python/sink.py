@@ -0,0 +1,208 @@
+##########################################################################################################################
+#  Purpose of this Script: Streaming output writers for the scraped rows. Rows are buffered and appended to the output
+#                              file in batches as they finish, so memory stays bounded and a crash only loses the rows
+#                              of the current batch. CSV, JSON Lines and Parquet backends share the same interface.
+#                          With a record type (see records.py) every batch is normalized into typed columns before it
+#                              is written, the parquet columns of the numbers are then numeric columns.
+#                          With a text store (see text_store.py) the large text fields are written to the store and
+#                              the output file only holds their reference.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import csv
+import json
+import logging
+import os
+import threading
+import time
+
+from records import column_types, normalize_rows, record_columns
+from text_store import externalize
+
+logger = logging.getLogger()
+
+
+class RecordSink:
+    ''' Base of the writers. Rows are buffered and written every `batch_size` rows or `flush_interval` seconds,
+        whichever comes first, the interval being kept by a timer thread even when no more rows come.
+        `on_flush(keys)` is called with the keys of the rows once they are on disk, from the timer thread too.
+        The rows are given in the order of `columns`, with a `record` type they are written in its columns.
+        With a `text_store` the `text_fields` are written to the store, which is closed with the sink.
+        Subclasses implement _write_batch and _close'''
+
+    def __init__(self, path, columns, batch_size=100, flush_interval=10.0, on_flush=None, record=None,
+                 text_store=None, text_fields=()):
+        self.path = path
+        self.input_columns = list(columns)
+        self.record = record
+        self.columns = record_columns(record) if record is not None else list(columns)
+        self.text_store = text_store
+        self.text_fields = tuple(text_fields) if text_store is not None else ()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.count = 0
+        self._buffer = []
+        self._keys = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._timer = None
+
+    def _start_timer(self):
+        # started with the first row, a sink whose constructor failed leaves no thread behind
+        if self._timer is None and self.flush_interval:
+            self._timer = threading.Thread(target=self._flush_on_interval, name='sink-flush', daemon=True)
+            self._timer.start()
+
+    def _flush_on_interval(self):
+        while True:
+            with self._lock:
+                due = self._last_flush + self.flush_interval
+            if self._closed.wait(max(0.0, due - time.monotonic())):
+                return
+            with self._lock:
+                if self._closed.is_set() or time.monotonic() < self._last_flush + self.flush_interval:
+                    continue
+                try:
+                    self._flush()
+                except Exception:
+                    # the rows stay buffered, the next write or the close raises the error
+                    logger.exception("Rows not written to %s", self.path)
+                    self._last_flush = time.monotonic()
+
+    def write(self, row, key=None):
+        ''' Buffers one row given in the order of `columns`'''
+        with self._lock:
+            self._start_timer()
+            self._buffer.append(row)
+            self._keys.append(key)
+            if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def skip(self, key):
+        ''' Records a key without a row, it is given to `on_flush` with the keys of the next batch'''
+        with self._lock:
+            self._start_timer()
+            self._keys.append(key)
+            if len(self._keys) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            rows = self._buffer
+            if self.record is not None:
+                rows = normalize_rows(rows, self.input_columns, self.record)
+            if self.text_fields:
+                # the texts are on disk before the rows referencing them
+                rows = externalize(rows, self.columns, self.text_fields, self.text_store)
+                self.text_store.flush()
+            self._write_batch(rows)
+            self.count += len(self._buffer)
+            logger.info("%s rows written to %s", self.count, self.path)
+        if self._keys and self.on_flush is not None:
+            self.on_flush(self._keys)
+        self._buffer = []
+        self._keys = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self._closed.set()
+        if self._timer is not None:
+            self._timer.join()
+        with self._lock:
+            self._flush()
+            self._close()
+            if self.text_store is not None:
+                self.text_store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_batch(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class CsvSink(RecordSink):
+    ''' Appends rows to a csv file, the header is written only when the file is new'''
+
+    def __init__(self, path, columns, **kwargs):
+        super().__init__(path, columns, **kwargs)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(self.columns)
+            self._file.flush()
+
+    def _write_batch(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class JsonLinesSink(RecordSink):
+    ''' Appends one json object per row'''
+
+    def __init__(self, path, columns, **kwargs):
+        super().__init__(path, columns, **kwargs)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _write_batch(self, rows):
+        self._file.writelines(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + '\n' for row in rows)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetSink(RecordSink):
+    ''' Writes every batch as a row group of one parquet file, needs pyarrow'''
+
+    def __init__(self, path, columns, **kwargs):
+        super().__init__(path, columns, **kwargs)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        types = column_types(self.record) if self.record is not None else {}
+        arrow_types = {float: pa.float64(), int: pa.int64(), bool: pa.bool_()}
+        self._schema = pa.schema([(column, arrow_types.get(types.get(column), pa.string()))
+                                  for column in self.columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def _write_batch(self, rows):
+        table = self._pa.Table.from_pylist([dict(zip(self.columns, row)) for row in rows], schema=self._schema)
+        self._writer.write_table(table)
+
+    def _close(self):
+        self._writer.close()
+
+
+SINKS = {
+    'csv': CsvSink,
+    'jsonl': JsonLinesSink,
+    'parquet': ParquetSink,
+}
+
+
+def open_sink(path, columns, fmt=None, **kwargs):
+    ''' Opens the writer for `fmt`, by default guessed from the file extension'''
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in SINKS:
+        raise ValueError("Unknown output format %r, expected one of %s" % (fmt, ", ".join(SINKS)))
+    return SINKS[fmt](path, columns, **kwargs)
@@ -0,0 +1,107 @@
+##########################################################################################################################
+#  Purpose of this Script: Extraction specs of the supported retailers. Fixing a selector or adding a retailer only
+#                              needs a change here, see extractors.py for the meaning of the FieldSpec options.
+#                          The specs are registered in registry.py, a retailer can also live in a module of its own
+#                              registering its spec the same way, see RETAILER_MODULES of all_retailer.py.
+##########################################################################################################################
+
+
+import re
+
+from extractors import FieldSpec, RetailerSpec
+from records import AmazonRecord, WalmartRecord
+from registry import SPECS, register
+
+
+# walmart.com
+
+def walmart_availability(add_to_cart):
+    return "In Stock" if add_to_cart == 'Add to cart' else "Out of Stock"
+
+
+def walmart_description(record):
+    ''' The about section holds the description followed by the feature list, keeping the text before the features'''
+    if record['Description'] != "No Information available":
+        keyword = record['Features'][:10]
+        record['Description'] = record['Description'][:record['Description'].find(keyword)]
+
+
+WALMART_ABOUT = 'div.about-desc.about-product-description.xs-margin-top'
+
+WALMART_SPEC = RetailerSpec(
+    name='walmart',
+    fields=(
+        FieldSpec('Title', 'h1.prod-ProductTitle.font-normal', strip=False, required=True),
+        FieldSpec('Categories', 'ol.breadcrumb-list', strip=False, post=lambda text: text.replace("/", ", ")),
+        # the stylized price holds the price twice, once for the screen readers
+        FieldSpec('Price', 'span.price.display-inline-block.arrange-fit.price.price--stylized span.visuallyhidden',
+                  fallbacks=('span.price.display-inline-block.arrange-fit.price.price--stylized',)),
+        FieldSpec('Ratings', 'span.ReviewsHeader-ratingPrefix.font-bold', strip=False, default="No Rating"),
+        FieldSpec('Availability', 'div.prod-product-cta-add-to-cart.display-inline-block', strip=False,
+                  post=walmart_availability, default="Out of Stock"),
+        FieldSpec('Features', WALMART_ABOUT, items='li', join="", strip=False, default="No Information available"),
+        FieldSpec('Description', WALMART_ABOUT, strip=False, default="No Information available"),
+    ),
+    finalize=walmart_description,
+    tracked=('Price', 'Ratings', 'Availability'),
+    record=WalmartRecord,
+    text_fields=('Features', 'Description'),
+    # the class attribute is matched as one string while the page is parsed, hence the regular expression
+    parse_only={'class_': re.compile(r'(^|\s)(breadcrumb-list|prod-ProductTitle|price--stylized|'
+                                     r'ReviewsHeader-ratingPrefix|prod-product-cta-add-to-cart|'
+                                     r'about-product-description)(\s|$)')},
+    hosts=('walmart.com',),
+    required_selectors=('h1.prod-ProductTitle',),
+)
+
+
+# amazon.com
+
+def amazon_availability(availability):
+    ''' The availability text as shown, records.parse_availability tells the in stock and out of stock texts apart'''
+    if availability == 'Available from these sellers.':
+        return 'In Stock.'
+    return availability
+
+
+def amazon_top_reviews(reviews):
+    ''' First five reviews on the product page, without the "Read more" link, on a single line'''
+    top = []
+    for review in reviews[:5]:
+        ind = review.find("Read more")
+        top.append(review[:ind] if ind >= 0 else review)
+    return "\n".join(top).replace("\n", "    ")
+
+
+AMAZON_SPEC = RetailerSpec(
+    name='amazon',
+    fields=(
+        FieldSpec('Title', '#productTitle', required=True),
+        FieldSpec('categories', '#wayfinding-breadcrumbs_container ul.a-unordered-list', items='li',
+                  post=lambda items: [i for i in items if len(i) > 2]),
+        # only the discounted products show a list price, not checked by the selector health
+        FieldSpec('List_price', 'span.priceBlockStrikePriceString.a-text-strike', min_hit_rate=0),
+        FieldSpec('price', '#priceblock_ourprice', strip=False),
+        FieldSpec('rating', 'span.a-icon-alt', default="Ratings not available"),
+        FieldSpec('Availability', '#availability', post=amazon_availability, default='No Info'),
+        FieldSpec('Features', '#feature-bullets ul.a-unordered-list', items='li', default="No Features"),
+        FieldSpec('product_description', '#productDescription', default="No Description"),
+        # the second node with exactly class="content", or the first one when there is only one
+        FieldSpec('product_details', '[class="content"]', nth=1),
+        FieldSpec('Top_Reviews', 'span[data-hook="review-body"]', many=True, strip=False, post=amazon_top_reviews,
+                  default="No Review", min_hit_rate=0),
+    ),
+    parse_only={'id': ['wayfinding-breadcrumbs_container', 'productTitle', 'averageCustomerReviews', 'price',
+                       'availability', 'feature-bullets', 'productDescription', 'detail-bullets',
+                       'detailBullets_feature_div', 'prodDetails', 'reviewsMedley']},
+    tracked=('List_price', 'price', 'rating', 'Availability'),
+    record=AmazonRecord,
+    text_fields=('Features', 'product_description', 'product_details', 'Top_Reviews'),
+    hosts=('amazon.com',),
+    required_selectors=('#productTitle',),
+)
+
+
+# SPECS is the registry, it also holds the retailers of the other modules once they are loaded
+register(WALMART_SPEC)
+register(AMAZON_SPEC)
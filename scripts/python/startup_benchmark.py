@@ -0,0 +1,112 @@
+##########################################################################################################################
+#  Purpose of this Script: Startup benchmark of the scrapers. Every measure runs in a fresh python process, so nothing
+#                              is cached by an earlier import:
+#                          - the import time of every module of scripts/python, and the heavy libraries (pandas,
+#                              selenium, requests, bs4, lxml, pyarrow) it loads, which should be none for all_retailer
+#                          - the time of "all_retailer.py --help"
+#                          - the first-url latency, from the start of the process to the exit of a one url http run
+#                              against the fixture server of benchmark.py
+#                          The results are saved as json under output/benchmarks to track regressions.
+
+#  Execution Instruction: python startup_benchmark.py [--repeat 5]
+##########################################################################################################################
+
+
+# importing required libraries
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmark import CURRENT_DIR, RESULTS_DIR, FixtureServer
+
+MODULES = ['all_retailer', 'fetcher', 'rate_limiter', 'browser_profile', 'failures', 'pipeline', 'parsers',
+           'extractors', 'specs', 'records', 'sink', 'text_store', 'page_cache', 'checkpoint', 'product_index',
+           'incremental', 'urls', 'reviews', 'job_queue', 'registry', 'selector_health', 'metrics',
+           'log_setup']
+HEAVY = ['pandas', 'numpy', 'selenium', 'requests', 'bs4', 'lxml', 'soupsieve', 'pyarrow']
+
+IMPORT_CODE = """
+import json, sys, time
+started = time.perf_counter()
+import %s
+print(json.dumps({'seconds': time.perf_counter() - started,
+                  'heavy': [name for name in %r if name in sys.modules]}))
+"""
+
+# one url scraped over http
+FIRST_URL_CODE = "import sys, all_retailer; all_retailer.main(sys.argv[1:])"
+
+
+def run_python(code, *args):
+    ''' Runs the code in a fresh interpreter from this directory, returns its wall seconds and stdout'''
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', code] + list(args), cwd=CURRENT_DIR, capture_output=True,
+                               text=True, check=True)
+    return time.perf_counter() - started, completed.stdout
+
+
+def import_times(repeat):
+    ''' {module: {"ms": median import ms, "heavy": heavy libraries loaded}}'''
+    results = {}
+    for module in MODULES:
+        runs = [json.loads(run_python(IMPORT_CODE % (module, HEAVY))[1].splitlines()[-1]) for _ in range(repeat)]
+        results[module] = {'ms': 1000 * statistics.median(run['seconds'] for run in runs), 'heavy': runs[0]['heavy']}
+    return results
+
+
+def first_url(repeat, retailer='amazon'):
+    ''' Median wall seconds of a one url http run and of "--help", the interpreter start included'''
+    with FixtureServer() as server, tempfile.TemporaryDirectory() as directory:
+        url = [job_url for job_retailer, job_url in server.jobs(2) if job_retailer == retailer][0]
+        input_path = os.path.join(directory, 'input.csv')
+        with open(input_path, 'w') as input_file:
+            input_file.write(url + "\n")
+        runs = []
+        for run in range(repeat):
+            run_dir = os.path.join(directory, str(run))
+            os.makedirs(run_dir)
+            seconds, _ = run_python(FIRST_URL_CODE, '--retailers', retailer, '--input',
+                                    '%s=%s' % (retailer, input_path), '--fetch-mode', 'http', '--parse-workers', '1',
+                                    '--output-dir', run_dir, '--state-dir', run_dir, '--format', 'jsonl')
+            runs.append(seconds)
+    help_code = "import all_retailer; all_retailer.main(['--help'])"
+    help_runs = [run_python(help_code)[0] for _ in range(repeat)]
+    baseline = [run_python("pass")[0] for _ in range(repeat)]
+    return {'first_url_ms': 1000 * statistics.median(runs), 'help_ms': 1000 * statistics.median(help_runs),
+            'interpreter_ms': 1000 * statistics.median(baseline)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and first-url latency of the scrapers")
+    parser.add_argument('--repeat', type=int, default=5, help="fresh processes per measure, the median is kept")
+    parser.add_argument('--output', default=None, help="json result file, by default under output/benchmarks")
+    args = parser.parse_args()
+
+    imports = import_times(args.repeat)
+    for module, result in sorted(imports.items(), key=lambda item: -item[1]['ms']):
+        print("import %-16s %8.1f ms  %s" % (module, result['ms'], ", ".join(result['heavy'])))
+    latency = first_url(args.repeat)
+    print("python startup %.1f ms, --help %.1f ms, first url %.1f ms" % (
+        latency['interpreter_ms'], latency['help_ms'], latency['first_url_ms']))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, 'startup_benchmark_' + datetime.now().strftime("%d_%m_%Y_%H_%M_%S") + '.json')
+    with open(output, 'w') as result_file:
+        json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'repeat': args.repeat,
+                   'imports': imports, **latency}, result_file, indent=2)
+    print("results saved in", output)
+    # all_retailer must stay free of the heavy libraries
+    return 1 if imports['all_retailer']['heavy'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+##########################################################################################################################
+#  Purpose of this Script: Side store of the large text fields (features, descriptions, product details, reviews).
+#                              With a text store the sinks write a short reference in place of these fields, so the
+#                              output file keeps one narrow line per product with the same columns, and the texts go
+#                              compressed into a sqlite file next to it.
+#                          The texts are stored once per content (the reference is a hash of the text) and compressed
+#                              with zstd when the zstandard package is installed, with zlib otherwise.
+#                          read_output() reads an output file back, the text fields are only loaded from the store
+#                              when they are accessed.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from collections.abc import Mapping
+
+REF_PREFIX = 'text:'
+
+
+def text_store_path(output_path):
+    ''' Path of the text store of an output file, "<output without extension>_texts.sqlite"'''
+    return os.path.splitext(output_path)[0] + '_texts.sqlite'
+
+
+def text_ref(text):
+    return REF_PREFIX + hashlib.sha1(text.encode('utf-8')).hexdigest()[:24]
+
+
+def is_ref(value):
+    return isinstance(value, str) and value.startswith(REF_PREFIX)
+
+
+class TextStore:
+    ''' Compressed texts by reference in a sqlite database at `path`. The new texts are written in batches of
+        `batch_size` and at flush(), a reference given out is readable once the store is flushed'''
+
+    def __init__(self, path, codec=None, level=None, batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self.level = level
+        self._compressor = None
+        if codec in (None, 'zstd'):
+            try:
+                import zstandard
+                self._compressor = zstandard.ZstdCompressor(level=level or 9)
+                codec = 'zstd'
+            except ImportError:
+                if codec == 'zstd':
+                    raise
+                codec = 'zlib'
+        self.codec = codec
+        self._decompressors = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS texts (
+                                  ref TEXT PRIMARY KEY,
+                                  codec TEXT NOT NULL,
+                                  size INTEGER NOT NULL,
+                                  data BLOB NOT NULL)""")
+
+    def compress(self, data):
+        if self.codec == 'zstd':
+            return self._compressor.compress(data)
+        return zlib.compress(data, 6 if self.level is None else self.level)
+
+    def decompress(self, codec, blob):
+        if codec == 'zlib':
+            return zlib.decompress(blob)
+        if codec not in self._decompressors:
+            import zstandard
+            self._decompressors[codec] = zstandard.ZstdDecompressor()
+        return self._decompressors[codec].decompress(blob)
+
+    def put(self, text):
+        ''' Returns the reference of the text, storing it when it is new'''
+        ref = text_ref(text)
+        with self._lock:
+            if ref not in self._pending:
+                data = text.encode('utf-8')
+                self._pending[ref] = (ref, self.codec, len(data), self.compress(data))
+                if len(self._pending) >= self.batch_size:
+                    self._flush()
+        return ref
+
+    def get(self, ref):
+        return self.get_many([ref]).get(ref)
+
+    def get_many(self, refs):
+        ''' {reference: text} of the references found in the store'''
+        refs = list(refs)
+        texts = {}
+        with self._lock:
+            for ref in refs:
+                if ref in self._pending:
+                    _, codec, _, blob = self._pending[ref]
+                    texts[ref] = self.decompress(codec, blob).decode('utf-8')
+            missing = [ref for ref in refs if ref not in texts]
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                for ref, codec, blob in self._conn.execute("SELECT ref, codec, data FROM texts WHERE ref IN (%s)"
+                                                           % ", ".join("?" * len(chunk)), chunk):
+                    texts[ref] = self.decompress(codec, blob).decode('utf-8')
+        return texts
+
+    def _flush(self):
+        if not self._pending:
+            return
+        self._conn.execute("BEGIN")
+        self._conn.executemany("INSERT OR IGNORE INTO texts (ref, codec, size, data) VALUES (?, ?, ?, ?)",
+                               list(self._pending.values()))
+        self._conn.execute("COMMIT")
+        self._pending = {}
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def externalize(rows, columns, fields, store):
+    ''' Returns the rows with the values of the `fields` columns replaced by their reference in the store.
+        The empty values are kept as they are'''
+    positions = [columns.index(field) for field in fields if field in columns]
+    stored = []
+    for row in rows:
+        row = list(row)
+        for position in positions:
+            if row[position]:
+                row[position] = store.put(str(row[position]))
+        stored.append(row)
+    return stored
+
+
+class LazyRow(Mapping):
+    ''' One row of an output file, the text fields stored by reference are read from the store on access'''
+
+    __slots__ = ('_values', '_store')
+
+    def __init__(self, values, store):
+        self._values = values
+        self._store = store
+
+    def __getitem__(self, column):
+        value = self._values[column]
+        if is_ref(value) and self._store is not None:
+            return self._store.get(value)
+        return value
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def ref(self, column):
+        ''' The stored value of the column, the reference of a text field'''
+        return self._values[column]
+
+    def __repr__(self):
+        return "LazyRow(%r)" % self._values
+
+
+class OutputReader:
+    ''' Iterates over the rows of an output file of the sinks as LazyRow, with the text store found next to the file
+        unless `store_path` is given. The text fields can be read until the reader is closed. Csv values are read
+        as strings'''
+
+    def __init__(self, path, fmt=None, store_path=None):
+        self.path = path
+        self.fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+        if self.fmt not in ('csv', 'jsonl', 'parquet'):
+            raise ValueError("Unknown output format %r" % self.fmt)
+        store_path = store_path or text_store_path(path)
+        self.store = TextStore(store_path) if os.path.exists(store_path) else None
+
+    def __iter__(self):
+        if self.fmt == 'csv':
+            with open(self.path, newline='', encoding='utf-8') as output_file:
+                for values in csv.DictReader(output_file):
+                    yield LazyRow(values, self.store)
+        elif self.fmt == 'jsonl':
+            with open(self.path, encoding='utf-8') as output_file:
+                for line in output_file:
+                    yield LazyRow(json.loads(line), self.store)
+        else:
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(self.path).iter_batches():
+                for values in batch.to_pylist():
+                    yield LazyRow(values, self.store)
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_output(path, fmt=None, store_path=None):
+    ''' with read_output(path) as rows: for row in rows: row['Features'] ...'''
+    return OutputReader(path, fmt, store_path)
@@ -0,0 +1,60 @@
+##########################################################################################################################
+#  Purpose of this Script: Helpers for the product urls given as input: normalization, canonical product key (the
+#                              amazon ASIN or the walmart item id) and the streaming reader of the input files.
+##########################################################################################################################
+
+
+# importing required libraries
+
+import csv
+import hashlib
+import re
+from itertools import islice
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# query parameters which never change the page content
+TRACKING_PARAMS = ('ref', 'ref_', 'pf_rd_r', 'pf_rd_p', 'pd_rd_r', 'pd_rd_w', 'pd_rd_wg', 'qid', 'sr', 'athcpid',
+                   'athpgid', 'athcgid', 'athznid', 'athieid', 'athstid', 'athguid', 'athwpid', 'athtvid', 'athancid')
+
+
+def normalize_url(url):
+    ''' Returns the url with a lower case scheme and host, without fragment and tracking parameters, and with the
+        remaining query parameters sorted, so that the same page always gives the same string'''
+    parts = urlsplit(url.strip())
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key not in TRACKING_PARAMS and not key.startswith('utm_')]
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(sorted(query)), ''))
+
+
+# ASIN of the /dp/, /gp/product/, /gp/aw/d/ and /product-reviews/ amazon urls, item id of the /ip/[<slug>/]<id> ones
+AMAZON_ASIN = re.compile(r'/(?:dp|gp/product|gp/aw/d|product-reviews|exec/obidos/asin)/([A-Z0-9]{10})(?:[/?]|$)',
+                         re.IGNORECASE)
+WALMART_ITEM = re.compile(r'/ip/(?:[^/?#]+/)?(\d+)(?:[/?#]|$)')
+
+
+def product_key(url):
+    ''' Returns the canonical product key of the url, "amazon:<ASIN>" or "walmart:<item id>", or the normalized url
+        for the other urls, so that the same product is fetched once whatever the query string'''
+    host = urlsplit(url.strip()).netloc.lower()
+    if 'amazon.' in host:
+        match = AMAZON_ASIN.search(url)
+        if match:
+            return 'amazon:' + match.group(1).upper()
+    elif 'walmart.' in host:
+        match = WALMART_ITEM.search(url)
+        if match:
+            return 'walmart:' + match.group(1)
+    return normalize_url(url)
+
+
+def shard_of(key, count):
+    ''' Shard (0 to count - 1) of a product key. The hash is stable across processes and machines, unlike hash()'''
+    return int(hashlib.sha1(key.encode('utf-8')).hexdigest()[:8], 16) % count
+
+
+def read_urls(path, limit=None):
+    ''' Yields the urls of the first column of the input csv file, one line at a time, at most `limit` of them'''
+    with open(path, newline='', encoding='utf-8') as input_file:
+        rows = (row[0].strip() for row in csv.reader(input_file) if row and row[0].strip())
+        yield from islice(rows, limit)